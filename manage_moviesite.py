@@ -23,6 +23,10 @@ import textwrap
 import requests
 
 from movie.utils import smart_unit, seconds_tostring
+from moviedb.cache import ProbeCache
+from moviedb.journal import RunJournal
+from moviedb.stats import StageTimer
+from moviedb.common import cached_fingerprint, volume_mounted
 
 if not platform.system() == "Windows":
     sys.exit("This script must be running on Windows")
@@ -37,6 +41,9 @@ URL_DIR = "/api/movies/dir"
 URL_UPDATE = "/api/movie/update"
 URL_REMOVE = "/api/movie/remove"
 URL_INDEXES = "/api/movies/indexes"
+URL_BATCH = "/api/movies/batch"
+# max operations in one batch request
+BATCH_SIZE = 200
 
 # pylint: disable=invalid-name
 log = logging.getLogger()
@@ -70,8 +77,19 @@ class FFProbeResult(NamedTuple):
     error: str
 
 
-def ffprobe(file_path) -> FFProbeResult:
-    """return ffprobe in json format"""
+def ffprobe(file_path, cache=None) -> FFProbeResult:
+    """
+    return ffprobe in json format
+        cache : ProbeCache instance, file not probed if unchanged since last probe
+    """
+    if cache:
+        try:
+            key = cache.key(file_path)
+        except OSError as _e:
+            return FFProbeResult(return_code=1212, json="", error=str(_e))
+        json_probe = cache.get(key)
+        if json_probe is not None:
+            return FFProbeResult(return_code=0, json=json_probe, error="")
     command_array = [
         "ffprobe",
         "-v",
@@ -93,6 +111,8 @@ def ffprobe(file_path) -> FFProbeResult:
         )
     except (UnicodeDecodeError, subprocess.CalledProcessError) as _e:
         return FFProbeResult(return_code=1212, json="", error=str(_e))
+    if cache and result.returncode == 0:
+        cache.put(key, result.stdout)
     return FFProbeResult(
         return_code=result.returncode, json=result.stdout, error=result.stderr
     )
@@ -350,6 +370,16 @@ class WebSession:
             return dbfname.replace(label + ":", "\\\\" + label)
         return dbfname.replace(label, self.labels[label], 1)
 
+    def batch(self, operations):
+        """run operations on server by batch requests, return results list"""
+        results = []
+        for start in range(0, len(operations), BATCH_SIZE):
+            datas_resp = self.api_call(
+                {"operations": operations[start : start + BATCH_SIZE]}, URL_BATCH
+            )
+            results.extend(datas_resp["results"])
+        return results
+
     def guess_movie(self, fname):
         """get movie from name in [filename, dbfilename, idmovie, fsubtitle]"""
         # try:
@@ -371,6 +401,30 @@ class WebSession:
             fsubtitle = None
         return (fname, dbfname, movie, fsubtitle)
 
+    def guess_movies(self, fnames):
+        """
+        get movies from names list (see guess_movie), with batch requests
+            return list of (fname, dbfname, movie, fsubtitle), movie["code"] != 0
+            if not found
+        """
+        dbfnames = [
+            int(fname) if fname.isdigit() else self.build_dbfilename(fname)
+            for fname in fnames
+        ]
+        movies = self.batch([{"op": "info", "file": dbfname} for dbfname in dbfnames])
+        guesses = []
+        for fname, dbfname, movie in zip(fnames, dbfnames, movies):
+            if movie["code"] == 0 and fname.isdigit():
+                dbfname = movie["file"]
+                fname = self.build_osfilename(dbfname)
+            # get subtitle file if any
+            base, _ = os.path.splitext(fname)
+            fsubtitle = base + ".srt"
+            if not os.path.exists(fsubtitle):
+                fsubtitle = None
+            guesses.append((fname, dbfname, movie, fsubtitle))
+        return guesses
+
     def supported_file(self, fname):
         """check file supported"""
         _, ext = os.path.splitext(fname)
@@ -401,10 +455,77 @@ class WebSession:
             {"offset": offset, "count": count, "column": column}, URL_INDEXES
         )
 
+    def stream_movies_datas(self, column):
+        """yield movies indexes rows ({"id": <id>[, "file": <file>]}), streamed by server"""
+        response = self.session.post(
+            url=self.args.address + URL_INDEXES,
+            headers=self.header,
+            cookies=self.cookies,
+            data={"json": json.dumps({"count": -1, "column": column, "stream": True})},
+            stream=True,
+        )
+        if response.status_code != 200:
+            raise APIException(response.reason)
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
 
 class VideoParser(WebSession):
     """Videos parser"""
 
+    def __init__(self, args):
+        super().__init__(args)
+        self.probe_cache = (
+            None if args.no_probe_cache else ProbeCache(args.probe_cache)
+        )
+        self.journal = None
+        # durations of parsing stages (client side, and server side for append)
+        self.stats = StageTimer(args.trace)
+
+    def open_journal(self):
+        """
+        open run journal, for a new run or a resumed run
+            arguments of resumed run replace command line arguments
+        """
+        if self.args.parse_only or self.args.simu:
+            return
+        self.journal = RunJournal(self.args.journal)
+        if self.args.resume:
+            run = self.args.resume
+            args = self.journal.resume(run, "append")
+            if args is None:
+                sys.exit(f"FAILED: unknown run {run}")
+            for key, value in args.items():
+                setattr(self.args, key, value)
+            self.args.resume = run
+            print(f"Resume run {run} ({len(self.journal.stages)} files checkpointed)")
+        else:
+            # password is not stored
+            args = {
+                key: value for key, value in vars(self.args).items() if key != "password"
+            }
+            run = self.journal.start("append", args)
+            print(f"Run {run} (resume with --resume {run})")
+
+    def checkpoint(self, dbfname, stage):
+        """record stage reached by file in run journal"""
+        self.stats.count(stage)
+        if self.journal:
+            self.journal.mark(dbfname, stage)
+
+    def resumed(self, fname):
+        """True if file already processed in resumed run"""
+        if not self.journal or not self.valid_file(fname):
+            return False
+        return self.journal.done(self.build_dbfilename(fname))
+
+    def probe(self, fname):
+        """ffprobe file, using probe results cache"""
+        with self.stats.stage("probe", fname):
+            return ffprobe(file_path=fname, cache=self.probe_cache)
+
     def movie_exists(self, fname):
         """Return True if movie file already exists"""
         if not self.valid_file(fname):
@@ -416,44 +537,78 @@ class VideoParser(WebSession):
             return False
         return datas_resp["code"] == 0
 
-    def parse_append_file(self, fname, **kwargs):
-        """Parse movie file"""
+    def movies_exist(self, fnames):
+        """Return set of movie files already existing (batch requests)"""
+        fnames = [fname for fname in fnames if self.valid_file(fname)]
+        try:
+            with self.stats.stage("exists"):
+                results = self.batch(
+                    [
+                        {"op": "info", "file": self.build_dbfilename(fname)}
+                        for fname in fnames
+                    ]
+                )
+        except APIException as _e:
+            return set()
+        return {fname for fname, resp in zip(fnames, results) if resp["code"] == 0}
+
+    def parse_append_file(self, fname, exists=None, **kwargs):
+        """
+        Parse movie file
+            exists : file already in DB (from movies_exist batch of directory),
+            requested if None
+        """
         if not self.valid_file(fname):
             return
+        self.stats.count("files")
         # build filename for DB
         dbfname = self.build_dbfilename(fname)
         print(f'* "{dbfname}" : ', end="")
-        try:
-            datas_resp = self.get_movie_infos(dbfname)
-        except APIException as _e:
-            print("FAILED: ", _e)
-            return
-        exists = datas_resp["code"] == 0
+        if exists is None:
+            with self.stats.stage("exists", dbfname):
+                exists = self.movie_exists(fname)
         if exists:
             print("  Already exists in DB => updating")
         else:
             print("  Not found in DB => adding")
-        if self.args.verbosity > 0:
-            print(json.dumps(datas_resp, indent=4))
+
+        #  remote options from arguments line
+        options = {
+            "simu": self.args.simu,
+            "force_parsing": self.args.force_parsing,
+            "exact_name": self.args.exact_name,
+            "queue": self.args.queue,
+        }
+
+        fingerprint = None
+        if not kwargs.get("id_db"):
+            with self.stats.stage("fingerprint", fname):
+                try:
+                    fingerprint = cached_fingerprint(fname, self.probe_cache)
+                except OSError as _e:
+                    print(f"  No fingerprint : {_e}")
+            # moved or copied file : no probe, no TMDB search
+            if (
+                fingerprint
+                and not (exists or self.args.force_parsing)
+                and self.relocate(dbfname, fingerprint, options)
+            ):
+                self.checkpoint(dbfname, "done")
+                return
 
         # parse ffmpeg
         if not kwargs.get("id_db"):
-            ffprobe_result = ffprobe(file_path=fname)
+            ffprobe_result = self.probe(fname)
             if ffprobe_result.return_code != 0:
                 print("  ERROR ffprobe")
                 print("  ", ffprobe_result.error, file=sys.stderr)
+                self.checkpoint(dbfname, "skipped")
                 return
             probe = ffprobe_result.json
+            self.checkpoint(dbfname, "probed")
         else:
             probe = json.dumps({"json": {"ffprobe": None}})
 
-        #  remote options from arguments line
-        options = {
-            "simu": self.args.simu,
-            "force_parsing": self.args.force_parsing,
-            "exact_name": self.args.exact_name,
-        }
-
         # request append/update
         data = {
             "options": json.dumps(options),
@@ -462,14 +617,18 @@ class VideoParser(WebSession):
             "title": "",
             "year": "",
             "ffprobe": probe,
+            "fingerprint": fingerprint,
         }
         if kwargs.get("id_db"):
             data["id_db"] = kwargs.get("id_db")
-        datas_resp = self.append_movie(data)
+        datas_resp = self.append_movie_timed(dbfname, data)
         if self.args.verbosity > 0:
             print(json.dumps(datas_resp, indent=4))
-        if datas_resp["num_movies"] in [0, 1]:
+        if datas_resp["num_movies"] in [0, 1] or datas_resp.get("queued"):
             print(f'  {datas_resp["result"]}')
+            self.checkpoint(
+                dbfname, "done" if datas_resp["num_movies"] == 1 else "skipped"
+            )
             return
         # dialog choose movie number
         if datas_resp["num_movies"] > 1:
@@ -501,6 +660,7 @@ class VideoParser(WebSession):
                     )
                     sel = input()
                     if not sel:
+                        self.checkpoint(dbfname, "skipped")
                         return
                     sel = int(sel) - 1
                     if sel >= 0 and sel < datas_resp["num_movies"]:
@@ -513,28 +673,79 @@ class VideoParser(WebSession):
                             "title": "",
                             "year": "",
                             "ffprobe": ffprobe_result.json,
+                            "fingerprint": fingerprint,
                         }
-                        datas_resp = self.api_call(data, URL_APPEND)
+                        datas_resp = self.append_movie_timed(dbfname, data)
                         if datas_resp["num_movies"] != 1:
                             print(f'  {datas_resp["result"]}')
+                        self.checkpoint(dbfname, "done")
                         break
                 except ValueError:
                     pass
 
+    def append_movie_timed(self, dbfname, data):
+        """append request, with durations of server stages added to statistics"""
+        with self.stats.stage("append", dbfname):
+            datas_resp = self.append_movie(data)
+        # server stages are included in append request duration
+        for stage, duration in datas_resp.get("timings", {}).items():
+            self.stats.add(f"server {stage}", duration, dbfname)
+        return datas_resp
+
+    def relocate(self, dbfname, fingerprint, options):
+        """
+        update database for a file known by its fingerprint
+            moved file (previous file missing, its volume mounted) : database entry
+            is repointed
+            copied file : database entry is cloned
+            return False if fingerprint is unknown
+        """
+        datas_resp = self.api_call({"fingerprint": fingerprint}, URL_INFO)
+        if datas_resp["code"] != 0:
+            return False
+        source = datas_resp["file"]
+        # source volume offline : file can't be known as moved, cloned
+        if not volume_mounted(source, self.volumes) or os.path.exists(
+            self.build_osfilename(source)
+        ):
+            print(f'  COPY of "{source}"')
+            data = {
+                "options": json.dumps(options),
+                "file": dbfname,
+                "id_tmdb": None,
+                "title": "",
+                "year": "",
+                "ffprobe": json.dumps({"json": {"ffprobe": None}}),
+                "id_db": datas_resp["id"],
+            }
+            self.append_movie(data)
+        else:
+            print(f'  MOVED from "{source}"')
+            self.update_movie_file(
+                datas_resp["id"], file=dbfname, file_status="OK", simu=self.args.simu
+            )
+        return True
+
     def parse_directory(self, parse_file, thepath):
         """Parse directory"""
         print(
             f'Parse directory "{thepath}"{" and subdirectories" if not self.args.no_recurs else ""}'
         )
-        for root, _, files in os.walk(thepath):
-            for filename in files:
-                fname = os.path.join(root, filename)
-                if self.movie_exists(fname) and not self.args.force_parsing:
+        for root, _, files in self.stats.iterate("walk", os.walk(thepath)):
+            fnames = [os.path.join(root, filename) for filename in files]
+            existing = self.movies_exist(fnames)
+            if self.args.update_missing:
+                self.update_missing_files(root, files)
+            for fname in fnames:
+                if self.resumed(fname):
+                    continue
+                if fname in existing and not self.args.force_parsing:
+                    self.stats.count("known")
                     if self.args.silent_exists:
                         continue
                     print(f'Skip "{fname}" : already exists in DB')
                     continue
-                parse_file(fname)
+                parse_file(fname, exists=fname in existing)
 
             # continue in sub-directories ?
             if self.args.no_recurs:
@@ -542,36 +753,29 @@ class VideoParser(WebSession):
                 break
 
     def update_missing_files(self, dirpath, files):
-        """update database for missing files in directory"""
-        volname, _ = os.path.splitdrive(dirpath)
-        if volname.startswith("\\\\"):
-            volname = volname.split("\\")[2]
-            moviedir = dirpath.replace("\\\\" + volname, volname + ":")
-        else:
-            # replace drive letter with volume name
-            volname, _ = self.volumes[dirpath.lower()[0]]
-            moviedir = volname + dirpath[1:]
-
+        """update database status for files of directory missing on disk"""
+        moviedir = self.build_dbfilename(dirpath)
         # get movie files in this directory from database
-        response = self.session.post(
-            url=self.args.address + URL_DIR,
-            headers=self.header,
-            cookies=self.cookies,
-            data={"json": json.dumps({"dir": moviedir, "recurs": False})},
-        )
-        datas_resp = response.json()
-        print(
-            f'Search for missing files in directory "{dirpath}" : {datas_resp["num_movies"]} files in database'
-        )
-        for movie_file in datas_resp["movies"]:
-            print(movie_file)
-            _, movie_file = os.path.split(movie_file)
-            if not movie_file in files:
-                print("Status file to update")
-                movie_file = os.path.join(moviedir, movie_file)
-                response = self.update_movie_file(movie_file, **{"status": "missing"})
-                datas_resp = response.json()
-                print("Status updated : ", datas_resp["reason"])
+        datas_resp = self.api_call({"dir": moviedir, "recurs": False}, URL_DIR)
+        files = {filename.lower() for filename in files}
+        operations = []
+        for movie_file, idfile in zip(datas_resp["movies"], datas_resp["ids"]):
+            _, basename = os.path.split(movie_file)
+            if basename.lower() not in files:
+                print(f'Missing file "{movie_file}"')
+                operations.append(
+                    {
+                        "op": "update",
+                        "id": idfile,
+                        "file_status": "missing",
+                        "simu": self.args.simu,
+                    }
+                )
+        if not operations:
+            return
+        results = self.batch(operations)
+        updated = sum(1 for result in results if result["code"] == 0)
+        print(f'Status "missing" updated for {updated}/{len(operations)} files')
 
     def valid_file(self, fname):
         """check file supported"""
@@ -588,7 +792,7 @@ class VideoParser(WebSession):
         if not self.valid_file(fname):
             return
         # parse ffmpeg
-        ffprobe_result = ffprobe(file_path=fname)
+        ffprobe_result = self.probe(fname)
         if ffprobe_result.return_code == 0:
             probe = smart_probe(json.loads(ffprobe_result.json))
             title = f' - Title: "{probe["title"]}"' if probe["title"] else ""
@@ -679,6 +883,7 @@ class VideoParser(WebSession):
     def process(self):
         """process all files"""
         self.login()
+        self.open_journal()
         if self.args.parse_only:
             parse_file = self.parse_file
         else:
@@ -701,11 +906,13 @@ class VideoParser(WebSession):
             glob_name = self.build_osfilename(glob_name)
             for fname in glob.glob(glob_name):
                 if os.path.isfile(fname):
-                    if self.args.copy_dest or self.args.move_dest:
-                        pass
-                    elif self.movie_exists(fname) and not (
-                        self.args.force_parsing or self.args.fix_title
-                    ):
+                    if self.resumed(fname):
+                        continue
+                    # copied or moved file : existence of destination unknown
+                    exists = None
+                    if not (self.args.copy_dest or self.args.move_dest):
+                        exists = self.movie_exists(fname)
+                    if exists and not (self.args.force_parsing or self.args.fix_title):
                         if self.args.silent_exists:
                             continue
                         print(f'Skip "{fname}" : already exists in DB')
@@ -719,11 +926,18 @@ class VideoParser(WebSession):
                         print("  ", _e)
                         continue
                     try:
-                        parse_file(dest, **args_parse)
+                        parse_file(dest, exists=exists, **args_parse)
                     except APIException as _e:
                         print("  FAILED:", _e)
                 elif os.path.isdir(fname):
                     self.parse_directory(parse_file, fname)
+        print(self.stats.summary())
+        self.stats.close()
+        if self.probe_cache:
+            print(self.probe_cache.stats())
+        if self.journal:
+            self.journal.finish()
+            print(self.journal.stats())
 
 
 class VideoMover(WebSession):
@@ -733,35 +947,34 @@ class VideoMover(WebSession):
         super().__init__(args)
         self.dest_dir = None
 
-    def move_file(self, fname):
-        """move a file"""
+    def move_file(self, guess):
+        """move a file, return database update operation or None"""
+        fname, dbname, movie, fsubtitle = guess
         # move file
         try:
-            fname, dbname, movie, fsubtitle = self.guess_movie(fname)
             print(f'Moving "{dbname}" ({fname}) ... ', end="")
             if movie["code"] != 0:
                 print('movie not found on server. Use "append" function')
-                return
+                return None
             if not self.args.simu:
                 shutil.move(fname, self.dest_dir)
                 if fsubtitle:
                     shutil.move(fsubtitle, self.dest_dir)
         except (shutil.SameFileError, shutil.Error) as _e:
             print(f'\n  FAILED to move "{dbname}" : {_e}')
-            return
+            return None
         print(" done")
 
         # update filename
         _, destname = os.path.split(fname)
         destname = os.path.join(self.dest_dir, destname)
         destname = self.build_dbfilename(destname)
-        try:
-            self.update_movie_file(
-                movie["id"], **{"file": destname, "simu": self.args.simu}
-            )
-        except APIException as _e:
-            print(f'FAILED to update: "{fname}" {_e}')
-            return
+        return {
+            "op": "update",
+            "id": movie["id"],
+            "file": destname,
+            "simu": self.args.simu,
+        }
 
     def process(self):
         """process moving files"""
@@ -778,12 +991,13 @@ class VideoMover(WebSession):
         # login on server
         self.login()
 
-        # process files
+        # get files
+        fnames = []
         for glob_name in self.args.filelist:
             glob_name = glob_name.rstrip("\r\n")
             if glob_name.isdigit():
                 # movie reference by id
-                self.move_file(glob_name)
+                fnames.append(glob_name)
                 continue
             if self.is_dbfilename(glob_name):
                 # filename in DB format (label replacing volume letter)
@@ -792,13 +1006,33 @@ class VideoMover(WebSession):
             for fname in glob.glob(glob_name):
                 count += 1
                 if os.path.isfile(fname):
-                    self.move_file(fname)
+                    fnames.append(fname)
                 elif os.path.isdir(fname):
                     print(f"FAILED: moving directory not supported ({fname})")
                     continue
             if not count:
                 print(f'FAILED: no movie found with name "{glob_name}" ')
 
+        # move files, and update filenames in database by batch
+        try:
+            guesses = self.guess_movies(fnames)
+        except APIException as _e:
+            print(f"FAILED: {_e}")
+            return
+        operations = []
+        for guess in guesses:
+            operation = self.move_file(guess)
+            if operation:
+                operations.append((guess[0], operation))
+        try:
+            results = self.batch([operation for _, operation in operations])
+        except APIException as _e:
+            print(f"FAILED to update database: {_e}")
+            return
+        for (fname, _), result in zip(operations, results):
+            if result["code"] != 0:
+                print(f'FAILED to update: "{fname}" {result["reason"]}')
+
 
 class VideoRemover(WebSession):
     """remove MovieFile entry"""
@@ -807,17 +1041,13 @@ class VideoRemover(WebSession):
         super().__init__(args)
         self.dest_dir = None
 
-    def remove_file(self, fname):
-        """move a file"""
-
-        # remove MovieFile on server
-        try:
-            fname, dbfname, movie, fsubtitle = self.guess_movie(fname)
-            print(f'Removing file reference from database for "{dbfname}"')
-            self.remove_movie_file(movie["id"], **{"simu": self.args.simu})
-        except APIException as _e:
-            print(f'FAILED to remove "{fname}" : {_e}')
+    def remove_file(self, guess, result):
+        """remove a file, after removing its reference from database"""
+        fname, dbfname, _, fsubtitle = guess
+        if result["code"] != 0:
+            print(f'FAILED to remove "{fname}" : {result["reason"]}')
             return
+        print(f'Removed file reference from database for "{dbfname}"')
         # remove file from volume
         try:
             if self.args.remove_file:
@@ -835,23 +1065,44 @@ class VideoRemover(WebSession):
         # login on server
         self.login()
 
-        # process files
+        # get files
+        fnames = []
         for glob_name in self.args.filelist:
             glob_name = glob_name.rstrip("\r\n")
             if glob_name.isdigit():
                 # movie reference by id
-                self.remove_file(glob_name)
+                fnames.append(glob_name)
                 continue
             if self.is_dbfilename(glob_name):
                 # filename in DB format (label replacing volume letter)
                 glob_name = self.build_osfilename(glob_name)
             for fname in glob.glob(glob_name):
                 if os.path.isfile(fname):
-                    self.remove_file(fname)
+                    fnames.append(fname)
                 elif os.path.isdir(fname):
                     print(f"FAILED: removing directory not supported ({fname})")
                     continue
 
+        # remove MovieFile on server by batch, then files
+        try:
+            guesses = []
+            for guess in self.guess_movies(fnames):
+                if guess[2]["code"] != 0:
+                    print(f'FAILED to remove "{guess[0]}" : {guess[2]["reason"]}')
+                    continue
+                guesses.append(guess)
+            results = self.batch(
+                [
+                    {"op": "remove", "id": movie["id"], "simu": self.args.simu}
+                    for _, _, movie, _ in guesses
+                ]
+            )
+        except APIException as _e:
+            print(f"FAILED: {_e}")
+            return
+        for guess, result in zip(guesses, results):
+            self.remove_file(guess, result)
+
 
 class VideoStatus(WebSession):
     """Videos status"""
@@ -875,17 +1126,18 @@ class VideoStatus(WebSession):
 
     def check_db_movies(self):
         """check all movies files"""
-        # get all movies files
+        # get all movies files, streamed
+        total = 0
         try:
-            datas_resp = self.get_movies_datas(0, -1, "file")
+            for row in self.stream_movies_datas("file"):
+                movie_file = self.build_osfilename(row["file"])
+                exists = os.path.exists(movie_file)
+                print(f'{"OK" if exists else "FAILED"} : "{movie_file}"')
+                total += 1
         except APIException as _e:
             print("FAILED: ", _e)
             return
-        print(f"Total movie files : {datas_resp['num_datas']}")
-        for movie_file in datas_resp["datas"]:
-            movie_file = self.build_osfilename(movie_file)
-            exists = os.path.exists(movie_file)
-            print(f'{"OK" if exists else "FAILED"} : "{movie_file}"')
+        print(f"Total movie files : {total}")
 
     def process(self):
         """process files"""
@@ -1021,11 +1273,47 @@ def main():
         help="Directory where move video files",
     )
 
+    sp1.add_argument(
+        "--queue",
+        action="store_true",
+        help="queue movies with several suggestions on server, instead of asking (see manage.py resolvematches)",
+    )
+    sp1.add_argument(
+        "--journal",
+        default=os.path.join(os.path.expanduser("~"), ".moviedb_journal.db"),
+        help="runs journal file, for option --resume (default: %(default)s)",
+    )
+    sp1.add_argument(
+        "--resume",
+        type=int,
+        metavar="RUN_ID",
+        help="resume run RUN_ID (same arguments), skipping files already processed",
+    )
+    sp1.add_argument(
+        "--update-missing",
+        action="store_true",
+        help='set status "missing" for database files not found in parsed directories',
+    )
+    sp1.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="write durations of parsing stages in FILE (JSON lines)",
+    )
     sp1.add_argument(
         "--parse-only",
         action="store_true",
         help="parse video files only (without connect to http server)",
     )
+    sp1.add_argument(
+        "--probe-cache",
+        default=os.path.join(os.path.expanduser("~"), ".moviedb_probecache.db"),
+        help="ffprobe results cache file (default: %(default)s)",
+    )
+    sp1.add_argument(
+        "--no-probe-cache",
+        action="store_true",
+        help="always probe files, don't use probe results cache",
+    )
 
     # subparser: move videos present in database
     sp2 = subparsers.add_parser(
@@ -1,7 +1,16 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Movie, MovieFile, Team, Poster, UserMovie, Person, Job
+from .models import (
+    Movie,
+    MovieFile,
+    Team,
+    Poster,
+    UserMovie,
+    Person,
+    Job,
+    PendingMatch,
+)
 
 
 class MovieAdmin(admin.ModelAdmin):
@@ -46,3 +55,10 @@ class TeamAdmin(admin.ModelAdmin):
 admin.site.register(Team, TeamAdmin)
 
 admin.site.register(Job)
+
+
+class PendingMatchAdmin(admin.ModelAdmin):
+    search_fields = ["file"]
+
+
+admin.site.register(PendingMatch, PendingMatchAdmin)
@@ -9,19 +9,22 @@ import os
 import errno
 import json
 import ntpath
+from itertools import groupby
 from io import StringIO
 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.conf import settings
 
 from movie.management.commands.movieparsing import Command, smart_probe
 from movie.models import MovieFile
-from movie.moviedesc import MovieDescription
+from movie.moviedesc import MovieDescription, best_candidate
 from movie.dlna import DLNA, dlna_discover as discover
 from movie.views import is_dlnable
+from moviedb.common import title_year_from_filename
 
 
 def makedir(directory):
@@ -42,7 +45,25 @@ def makedir(directory):
 @staff_member_required
 def append_movie(request):
     """
-    AJAX append movie to DB
+    AJAX append movie to DB (see do_append)
+    """
+    return JsonResponse(do_append(json.loads(request.POST["json"])))
+
+
+def do_append(datas_json):
+    """
+    append movie to DB (see append_file), with durations of stages in result :
+        timings: {<STAGE>: <SECONDS>}
+    """
+    manage = Command()
+    result = append_file(manage, datas_json)
+    result["timings"] = manage.stats.timings()
+    return result
+
+
+def append_file(manage, datas_json):
+    """
+    append movie to DB
         - movie format (tracks, rate...) must be parsed by source
     Input JSON :
         options : <STRING ARRAY>
@@ -51,14 +72,13 @@ def append_movie(request):
         file
         year
         ffprobe
+        [fingerprint]
     Return JSON :
         code: <NUM>,
         num_movies: <NUM>,
         result: <STRING>,
         id_added: <NUM>[OPTIONAL],
     """
-
-    datas_json = json.loads(request.POST["json"])
     options = json.loads(datas_json["options"])
     id_tmdb = datas_json["id_tmdb"]
     id_db = datas_json["id_db"] if "id_db" in datas_json else None
@@ -66,11 +86,11 @@ def append_movie(request):
     _, basename = ntpath.split(movie_file)
     year = datas_json["year"]
     movie_format = json.loads(datas_json["ffprobe"])
+    fingerprint = datas_json.get("fingerprint")
     # add smart infos to original ffmpeg probe
     if not id_db:
         container = smart_probe(movie_format)
 
-    manage = Command()
     # set options in Command
     manage.options = {}
     for option in options:
@@ -80,74 +100,59 @@ def append_movie(request):
     if id_db:
         src_movie = manage.get_moviefile(id_db)
         # on copy or move file already in DB
-        manage.add_or_update_moviefile(
-            movie_file,
-            "OK",
-            src_movie.file_size,
-            src_movie.movie_format,
-            src_movie.bitrate,
-            src_movie.screen_size,
-            src_movie.duration,
-            src_movie.movie,
-        )
-        return JsonResponse(
-            {
-                "code": 0,
-                "num_movies": 1,
-                "result": f'Append copy "{src_movie.movie.title}" - {src_movie.movie.release_year} (id {id_db})',
-                "id_added": id_db,
-            }
-        )
+        with transaction.atomic():
+            moviefile = manage.add_or_update_moviefile(
+                movie_file,
+                "OK",
+                src_movie.file_size,
+                src_movie.movie_format,
+                src_movie.bitrate,
+                src_movie.screen_size,
+                src_movie.duration,
+                src_movie.movie,
+                src_movie.fingerprint,
+            )
+            if not manage.options.get("simu") and moviefile.id != src_movie.id:
+                moviefile.streams.all().delete()
+                manage.copy_streams(src_movie.id, moviefile)
+        return {
+            "code": 0,
+            "num_movies": 1,
+            "result": f'Append copy "{src_movie.movie.title}" - {src_movie.movie.release_year} (id {id_db})',
+            "id_added": id_db,
+        }
 
     if id_tmdb:
-        movie = MovieDescription.from_id(manage.tmdb.movie, id_tmdb)
+        with manage.stats.stage("details", movie_file):
+            movie = MovieDescription.from_id(manage.tmdb.movie, id_tmdb)
         if not movie:
-            return JsonResponse(
-                {"code": -1, "num_movies": 0, "reason": "TMDB id not found"}
-            )
-        # create/update Movie description, Team and Posters
-        movie_desc = manage.add_or_update_moviedesc(movie)
-        manage.add_or_update_team(movie_desc)
-        manage.add_or_update_poster(movie_desc, movie.original_language)
-        # create/update MovieFile
-        fmt = container["format"]
-        moviefile = manage.add_or_update_moviefile(
-            movie_file,
-            "OK",
-            fmt["size"],
-            f'container: {fmt["format_name"]} | {container["smart_streams"]}',
-            fmt["bit_rate"],
-            fmt["screen_size"],
-            int(float(fmt["duration"])),
-            movie_desc,
-        )
-        return JsonResponse(
-            {
-                "code": 0,
-                "num_movies": 1,
-                "result": f'Append/update "{movie_desc.title}" - {movie_desc.release_year} (id {moviefile.id})',
-                "id_added": moviefile.id,
-            }
-        )
+            return {"code": -1, "num_movies": 0, "reason": "TMDB id not found"}
+        # create/update Movie description, Team, Posters and MovieFile
+        moviefile = manage.store_movie(movie_file, movie, container, fingerprint)
+        manage.memorize_match(*title_year_from_filename(basename), movie.id_tmdb)
+        return {
+            "code": 0,
+            "num_movies": 1,
+            "result": f'Append/update "{moviefile.movie.title}" - {moviefile.movie.release_year} (id {moviefile.id})',
+            "id_added": moviefile.id,
+        }
 
     # determine movie title, year
-    moviename, _ = os.path.splitext(basename)
-    # get optionnal year after title (ex: "Hollow man.2000")
-    year = None
-    words = moviename.split(".")
-    if len(words) > 1:
-        for _id in range(len(words) - 1, 0, -1):
-            year = words[_id]
-            if year.isnumeric() and int(year) > 1900 and int(year) < 2100:
-                moviename = " ".join(words[:_id])
-                break
-    # replace various characters
-    moviename = moviename.replace(".", " ").replace("_", " ")
-    # and research in TBDB
-    movies = MovieDescription.from_search(manage.tmdb.search, moviename, year=year)
+    moviename, year = title_year_from_filename(basename)
+    id_tmdb = manage.memo_match(moviename, year)
+    with manage.stats.stage("search", movie_file):
+        movies = None
+        if id_tmdb:
+            # title already resolved
+            movies = manage.memo_movies(id_tmdb, moviename, year)
+        if movies is None:
+            # and research in TBDB
+            movies = MovieDescription.from_search(
+                manage.tmdb.search, moviename, year=year
+            )
 
     if len(movies) == 0:
-        return JsonResponse({"code": 0, "num_movies": 0, "result": "None suggestions"})
+        return {"code": 0, "num_movies": 0, "result": "None suggestions"}
 
     if len(movies) > 1 and options["exact_name"]:
         # check if exact title exists in list
@@ -164,6 +169,25 @@ def append_movie(request):
         if len(exact_movies) == 1:
             movies = exact_movies
 
+    if len(movies) > 1:
+        # try automatic choice
+        with manage.stats.stage("match", movie_file):
+            movie, _ = best_candidate(
+                manage.tmdb.movie, movies, moviename, year, container
+            )
+        if movie:
+            movies = [movie]
+
+    if len(movies) > 1 and options.get("queue"):
+        # choice made later (command resolvematches)
+        manage.queue_match(movie_file, datas_json["ffprobe"], movies)
+        return {
+            "code": 0,
+            "num_movies": len(movies),
+            "result": f"{len(movies)} suggestions, queued",
+            "queued": True,
+        }
+
     if len(movies) > 1:
         result = f"{len(movies)} suggestions"
         datas = [
@@ -178,55 +202,56 @@ def append_movie(request):
             ]
             for movie in movies
         ]
-        return JsonResponse(
-            {"code": 0, "num_movies": len(movies), "result": result, "movies": datas}
-        )
+        return {
+            "code": 0,
+            "num_movies": len(movies),
+            "result": result,
+            "movies": datas,
+        }
 
     # here, we have an unique movie
     moviedesc = movies[0]
-    # MovieDescription.from_search doesn't return genres/, so update
-    moviedesc.get_full_description(manage.tmdb.movie)
-    # create/update Movie description, Team and Posters
-    movie_db = manage.add_or_update_moviedesc(moviedesc)
-    manage.add_or_update_team(movie_db)
-    manage.add_or_update_poster(movie_db, moviedesc.original_language)
-    # create/update MovieFile
-    fmt = container["format"]
-    moviefile = manage.add_or_update_moviefile(
-        movie_file,
-        "OK",
-        fmt["size"],
-        f'container: {fmt["format_name"]} | {container["smart_streams"]}',
-        fmt["bit_rate"],
-        fmt["screen_size"],
-        int(float(fmt["duration"])),
-        movie_db,
-    )
-    return JsonResponse(
-        {
-            "code": 0,
-            "num_movies": 1,
-            "result": f'Append/update "{movie_db.title}" - {movie_db.release_year} (id {moviefile.id})',
-            "id_added": moviefile.id,
-        }
-    )
+    # MovieDescription.from_search doesn't return genres/credits/images, so update
+    with manage.stats.stage("details", movie_file):
+        moviedesc.get_full_description(manage.tmdb.movie)
+    # create/update Movie description, Team, Posters and MovieFile
+    moviefile = manage.store_movie(movie_file, moviedesc, container, fingerprint)
+    manage.memorize_match(moviename, year, moviedesc.id_tmdb)
+    return {
+        "code": 0,
+        "num_movies": 1,
+        "result": f'Append/update "{moviefile.movie.title}" - {moviefile.movie.release_year} (id {moviefile.id})',
+        "id_added": moviefile.id,
+    }
 
 
 @staff_member_required
 def movie_info(request):
     """get movie info by id or filename"""
-    data_req = json.loads(request.POST["json"])
+    return JsonResponse(do_info(json.loads(request.POST["json"])))
+
+
+def do_info(data_req):
+    """get movie info by id, filename or fingerprint"""
     # check if file exists in database
     try:
-        movie_file = data_req["file"]
-        if isinstance(movie_file, int) or movie_file.isdigit():
-            movie = MovieFile.objects.get(id=int(movie_file))
+        if "fingerprint" in data_req:
+            # first file with same content
+            movie = MovieFile.objects.filter(
+                fingerprint=data_req["fingerprint"]
+            ).first()
+            if not movie:
+                raise ObjectDoesNotExist()
         else:
-            movie = MovieFile.objects.get(file__iexact=movie_file)
+            movie_file = data_req["file"]
+            if isinstance(movie_file, int) or movie_file.isdigit():
+                movie = MovieFile.objects.get(id=int(movie_file))
+            else:
+                movie = MovieFile.objects.with_file(movie_file).get()
     except ObjectDoesNotExist:
-        return JsonResponse({"code": 1, "reason": "not found"})
+        return {"code": 1, "reason": "not found"}
 
-    data_resp = {
+    return {
         "code": 0,
         "reason": "ok",
         "id": movie.id,
@@ -240,8 +265,6 @@ def movie_info(request):
         "movie_format": movie.movie_format,
     }
 
-    return JsonResponse(data_resp)
-
 
 @staff_member_required
 def movies_dir(request):
@@ -252,19 +275,12 @@ def movies_dir(request):
         return JsonResponse({"code": -2, "reason": "Key error"})
     directory = data_req["dir"]
     recurs = data_req["recurs"]
-    movies = MovieFile.objects.filter(file__istartswith=directory)
-    if recurs:
-        results = [movie.file for movie in movies]
-    else:
-        results = []
-        # remove sub-directories
-        for movie in movies:
-            moviefile = movie.file[len(directory) + 1 :]
-            pathleft, _ = ntpath.split(moviefile)
-            if pathleft:
-                continue
-            results.append(movie.file)
-    return JsonResponse({"code": 0, "num_movies": len(movies), "movies": results})
+    movies = MovieFile.objects.in_directory(directory, recurs).values_list("file", "id")
+    results = [file for file, _ in movies]
+    ids = [idfile for _, idfile in movies]
+    return JsonResponse(
+        {"code": 0, "num_movies": len(results), "movies": results, "ids": ids}
+    )
 
 
 @staff_member_required
@@ -274,10 +290,15 @@ def update_movie(request):
         data_req = json.loads(request.POST["json"])
     except KeyError:
         return JsonResponse({"code": -2, "reason": "Key error"})
+    return JsonResponse(do_update(data_req))
+
+
+def do_update(data_req):
+    """update some fields in movie"""
     try:
         movie = MovieFile.objects.get(id=data_req["id"])
     except ObjectDoesNotExist:
-        return JsonResponse({"code": 1, "reason": "not found"})
+        return {"code": 1, "reason": "not found"}
 
     if "file" in data_req:
         movie.file = data_req["file"]
@@ -291,8 +312,8 @@ def update_movie(request):
         if not data_req.get("simu", False):
             movie.save()
     except Exception as _e:
-        return JsonResponse({"code": 1, "reason": _e})
-    return JsonResponse({"code": 0})
+        return {"code": 1, "reason": str(_e)}
+    return {"code": 0}
 
 
 @staff_member_required
@@ -302,43 +323,141 @@ def remove_movie(request):
         data_req = json.loads(request.POST["json"])
     except KeyError:
         return JsonResponse({"code": -2, "reason": "key error"})
+    return JsonResponse(do_remove(data_req))
+
+
+def do_remove(data_req):
+    """remove MovieFile object"""
     try:
         movie = MovieFile.objects.get(id=data_req["id"])
     except ObjectDoesNotExist:
-        return JsonResponse({"code": 1, "reason": "not found"})
+        return {"code": 1, "reason": "not found"}
 
     try:
         if not data_req.get("simu", False):
             movie.delete()
     except Exception as _e:
-        return JsonResponse({"code": 1, "reason": _e})
-    return JsonResponse({"code": 0})
+        return {"code": 1, "reason": str(_e)}
+    return {"code": 0}
+
+
+BATCH_OPERATIONS = {
+    "append": do_append,
+    "info": do_info,
+    "update": do_update,
+    "remove": do_remove,
+}
+# operations with network requests (TMDB, posters) : not run in batch transaction
+NETWORK_OPERATIONS = {"append"}
+
+
+def batch_operation(operation):
+    """run an operation of a batch, in a savepoint if a transaction is open"""
+    if not isinstance(operation, dict) or not isinstance(operation.get("op"), str):
+        return {"code": -2, "reason": "invalid operation"}
+    function = BATCH_OPERATIONS.get(operation["op"])
+    if not function:
+        return {"code": -2, "reason": "invalid operation"}
+    try:
+        with transaction.atomic():
+            return function(operation)
+    except Exception as _e:
+        return {"code": -1, "reason": str(_e)}
+
+
+def is_network_operation(operation):
+    """operation with network requests"""
+    return (
+        isinstance(operation, dict) and str(operation.get("op")) in NETWORK_OPERATIONS
+    )
+
+
+@staff_member_required
+def movies_batch(request):
+    """
+    run a list of operations, consecutive database operations in one transaction
+    Input JSON :
+        operations : [{"op": "append"|"info"|"update"|"remove", <operation datas>}, ...]
+    Return JSON :
+        code: <NUM>,
+        results: [<operation result>, ...] (same order as operations)
+    an operation failing is rolled back alone, others are committed
+    "append" operations request TMDB : they are run outside of the batch transaction
+    (each one stores its movie in its own transaction)
+    """
+    try:
+        data_req = json.loads(request.POST["json"])
+        operations = data_req["operations"]
+    except (KeyError, TypeError):
+        return JsonResponse({"code": -2, "reason": "json key error"})
+    if not isinstance(operations, list):
+        return JsonResponse({"code": -2, "reason": "operations must be a list"})
+    results = []
+    for network, group in groupby(operations, key=is_network_operation):
+        if network:
+            for operation in group:
+                try:
+                    results.append(BATCH_OPERATIONS[operation["op"]](operation))
+                except Exception as _e:
+                    results.append({"code": -1, "reason": str(_e)})
+        else:
+            with transaction.atomic():
+                results.extend(batch_operation(operation) for operation in group)
+    return JsonResponse({"code": 0, "results": results})
 
 
 def movies_ids(request):
-    """return list of column : MovieFile.file, MovieFile.id"""
+    """
+    return list of column : MovieFile.file, MovieFile.id, ordered by id
+    Input JSON :
+        column : "file" | "idfile"
+        count : <NUM> (-1 : all)
+        [after] : <NUM> rows with id greater (keyset pagination, instead of offset)
+        [offset] : <NUM>
+        [stream] : <BOOL> NDJSON response, one line per row : {"id": <NUM>[, "file": <STRING>]}
+    Return JSON :
+        code: <NUM>,
+        num_datas: <NUM>,
+        datas: [<column value>, ...],
+        last: <NUM> id of last row, for next page (None if no rows)
+    """
     try:
         data_req = json.loads(request.POST["json"])
-        offset = data_req["offset"]
         count = data_req["count"]
         column = data_req["column"]
     except KeyError:
         return JsonResponse({"code": -2, "reason": "json key error"})
     if column == "file":
-        datas = [f for f in MovieFile.objects.all().values_list("file", flat=True)]
+        fields = ("id", "file")
     elif column == "idfile":
-        datas = [f for f in MovieFile.objects.all().values_list("id", flat=True)]
+        fields = ("id",)
     else:
         return JsonResponse({"code": -2, "reason": "invalid column"})
-    if count == -1:
-        end = None
-    else:
-        end = offset + count
+    moviefiles = MovieFile.objects.order_by("id")
+    if data_req.get("after") is not None:
+        # index seek on primary key : page cost doesn't depend on its position
+        moviefiles = moviefiles.filter(id__gt=data_req["after"])
+    offset = data_req.get("offset", 0)
+    end = None if count == -1 else offset + count
+    rows = moviefiles.values_list(*fields)[offset:end]
+
+    if data_req.get("stream"):
+
+        def ndjson_rows():
+            for row in rows.iterator(chunk_size=2000):
+                yield json.dumps(dict(zip(fields, row))) + "\n"
+
+        return StreamingHttpResponse(
+            ndjson_rows(), content_type="application/x-ndjson"
+        )
+
+    rows = list(rows)
     return JsonResponse(
         {
             "code": 0,
-            "num_datas": len(datas[offset:end]),
-            "datas": datas[offset:end],
+            "num_datas": len(rows),
+            "datas": [row[-1] for row in rows],
+            "last": rows[-1][0] if rows else None,
         }
     )
 
@@ -482,7 +601,7 @@ def dlna_check_medias(request):
             dlna_titles[name] = uri
 
     contents = []
-    movies = MovieFile.objects.filter(file__istartswith=device).order_by("movie__title")
+    movies = MovieFile.objects.on_volume(device).order_by("movie__title")
     for movie in movies:
         _, basename = ntpath.split(movie.file)
         basename, _ = ntpath.splitext(basename)
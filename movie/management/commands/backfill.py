@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Administration : fill in datas deferred during movies parsing
+
+"""
+
+import os
+import sys
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.conf import settings
+
+from movie.models import Movie, MovieFile, Person
+from movie.management.commands.movieparsing import Command as ParsingCommand
+from moviedb.common import get_volumes, build_osfilename, file_fingerprint
+
+
+class Command(BaseCommand):
+    """
+    class Command
+    """
+
+    help = (
+        "Fill in datas deferred during movies parsing (posters, profiles),"
+        " or added since (fingerprints)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["posters", "profiles", "fingerprints"],
+            help="datas to fill in",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="posters : all movies with less than MAX_POSTERS posters,"
+            " not only those with downloads deferred",
+        )
+        parser.add_argument(
+            "--simu",
+            action="store_true",
+            help="don't make any modifications on database",
+        )
+
+    def fill_posters(self, parsing, all_movies):
+        """
+        download missing posters of movies
+            movies with posters downloads deferred during parsing, or all movies with
+            less than MAX_POSTERS posters
+        """
+        if all_movies:
+            movies = Movie.objects.annotate(num_posters=Count("poster")).filter(
+                num_posters__lt=settings.MAX_POSTERS
+            )
+        else:
+            movies = Movie.objects.filter(posters_deferred=True)
+        for movie in movies.order_by("title"):
+            parsing.complete_posters(movie)
+
+    def fill_profiles(self, parsing, simu, batch_size=200):
+        """
+        look up profile images of persons without one, in batches of concurrent requests
+            url_img None : not looked up yet, "" : no image on TMDB
+        """
+        persons = list(
+            Person.objects.filter(url_img__isnull=True).only("id_tmdb", "name")
+        )
+        print(f"{len(persons)} persons to look up")
+        parsing.tmdb.start_async(
+            rate=settings.TMDB_REQUESTS_PER_SECOND,
+            max_inflight=settings.TMDB_MAX_REQUESTS_IN_FLIGHT,
+        )
+        found = 0
+        try:
+            for start in range(0, len(persons), batch_size):
+                batch = persons[start : start + batch_size]
+                results = parsing.tmdb.gather(
+                    [parsing.tmdb.aio.person_images(person.id_tmdb) for person in batch]
+                )
+                updated = []
+                for person, images in zip(batch, results):
+                    if isinstance(images, Exception):
+                        print(f'FAILED "{person.name}" : {images}')
+                        continue
+                    profiles = images.get("profiles")
+                    person.url_img = profiles[-1]["file_path"] if profiles else ""
+                    found += bool(person.url_img)
+                    updated.append(person)
+                if not simu:
+                    Person.objects.bulk_update(updated, ["url_img"])
+                print(f"{start + len(batch)} persons looked up")
+        finally:
+            parsing.tmdb.stop_async()
+        print(f"{found} profile images found")
+
+    def fill_fingerprints(self, simu):
+        """compute fingerprints of movie files (files on accessible volumes)"""
+        if platform.system() != "Windows":
+            sys.exit("Fingerprints can be only computed on Windows system.")
+        volumes = get_volumes()
+        moviefiles = MovieFile.objects.filter(fingerprint__isnull=True).only("file")
+        total = moviefiles.count()
+        updated = []
+        for moviefile in moviefiles.iterator():
+            fname = build_osfilename(moviefile.file, volumes)
+            if not os.path.exists(fname):
+                continue
+            try:
+                moviefile.fingerprint = file_fingerprint(fname)
+            except OSError as _e:
+                print(f'FAILED "{fname}" : {_e}')
+                continue
+            updated.append(moviefile)
+            print(f'"{moviefile.file}" : {moviefile.fingerprint}')
+        if not simu:
+            MovieFile.objects.bulk_update(updated, ["fingerprint"], batch_size=500)
+        print(f"{len(updated)} fingerprints on {total} files")
+
+    def handle(self, *args, **options):
+        """
+        Handle command
+
+            Warning : must return None or string, else Exception
+        """
+        if options["action"] in ("posters", "profiles"):
+            parsing = ParsingCommand()
+            parsing.options = {"simu": options["simu"], "force_parsing": False}
+            parsing.open_tmdb()
+            if options["action"] == "posters":
+                self.fill_posters(parsing, options["all"])
+            else:
+                self.fill_profiles(parsing, options["simu"])
+        elif options["action"] == "fingerprints":
+            self.fill_fingerprints(options["simu"])
+        return None
@@ -93,7 +93,7 @@ class Command(BaseCommand):
                         continue
 
                     try:
-                        movie = MovieFile.objects.get(file__iexact=fname)
+                        movie = MovieFile.objects.with_file(fname).get()
                     except ObjectDoesNotExist:
                         movie = MovieFile(file=fname)
                     movie.file_status = file_status
@@ -13,24 +13,66 @@ import glob
 import locale
 import platform
 import textwrap
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import lru_cache
 import requests
 
 import unidecode
+import pycountry
+from tmdbv3api.exceptions import TMDbException
 
 from django.core.management.base import BaseCommand
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.core.files.base import ContentFile
 from django.conf import settings
 from django.utils.timezone import make_aware
 
 
-from movie.models import MovieFile, Movie, Team, Poster, Person, Job
-from movie.moviedesc import MovieDescription
+from movie.models import (
+    MovieFile,
+    Movie,
+    Genre,
+    Country,
+    Team,
+    Poster,
+    Person,
+    Job,
+    ScannedDirectory,
+    Stream,
+    PendingMatch,
+    MatchMemo,
+)
+from movie.moviedesc import MovieDescription, best_candidate, normalize_title
 from moviedb.tmdb import TMDB_Api
-from moviedb.ffprobe import ffprobe, smart_probe
-from moviedb.common import get_volumes, build_dbfilename
+from moviedb.ffprobe import ffprobe, smart_probe, stream_infos
+from moviedb.cache import ProbeCache, ResponseCache
+from moviedb.journal import RunJournal, FINAL_STAGES
+from moviedb.stats import StageTimer
+from moviedb.common import (
+    get_volumes,
+    get_http_session,
+    build_dbfilename,
+    build_osfilename,
+    cached_fingerprint,
+    normalize_dbfilename,
+    title_year_from_filename,
+    volume_mounted,
+)
+
+
+@lru_cache(maxsize=None)
+def tmdb_cache():
+    """
+    TMDB responses cache, one connection shared by all commands of process
+    (a Command is created for each web API request)
+    """
+    return ResponseCache(
+        settings.TMDB_CACHE, settings.TMDB_CACHE_TTL, settings.TMDB_CACHE_MAX_SIZE
+    )
 
 
 class Command(BaseCommand):
@@ -43,7 +85,7 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument(
-            "filelist", nargs="+", help="files or directories list to parse"
+            "filelist", nargs="*", help="files or directories list to parse"
         )
         parser.add_argument(
             "--show-only",
@@ -85,6 +127,79 @@ class Command(BaseCommand):
             action="store_true",
             help="Do not display existant movies",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="number of files probed in parallel (default 1)",
+        )
+        parser.add_argument(
+            "--probe-timeout",
+            type=int,
+            default=settings.FFPROBE_TIMEOUT,
+            help=f"max seconds for probing a file (default {settings.FFPROBE_TIMEOUT})",
+        )
+        parser.add_argument(
+            "--no-probe-cache",
+            action="store_true",
+            help="always probe files, don't use probe results cache",
+        )
+        parser.add_argument(
+            "--no-tmdb-cache",
+            action="store_true",
+            help="always request TMDB, don't use TMDB responses cache",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="walk all directories, even those unchanged since last scan",
+        )
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help="queue files with several TMDB suggestions, to be resolved later with command resolvematches",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="RUN_ID",
+            help="resume run RUN_ID (same arguments), skipping files already processed",
+        )
+        parser.add_argument(
+            "--commit-every",
+            type=int,
+            default=1,
+            help="commit database every N stored files (default: each file)",
+        )
+        parser.add_argument(
+            "--trace",
+            metavar="FILE",
+            help="write durations of parsing stages in FILE (JSON lines)",
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # database files loaded in memory : {normalized dbfilename: (id, status)}
+        self.known_files = {}
+        # normalized directories whose database files are all in known_files
+        self.known_prefixes = []
+        # directories scanned in this run, saved in journal at end :
+        # [(directory, mtime, subdirs, dbfilenames)]
+        self.scanned_dirs = []
+        self.unchanged_dirs = 0
+        # fingerprints of database files : {fingerprint: id} (None: not loaded)
+        self.fingerprints = None
+        # normalized database filenames in pending matches queue (None: not loaded)
+        self.pending_files = None
+        # run journal (None: no checkpoints), and checkpoints waiting for group commit
+        self.journal = None
+        self.checkpoints = []
+        # database writes of files waiting for group commit (option --commit-every)
+        self.group = None
+        self.uncommitted = 0
+        # durations of parsing stages (walk, probe, search, db, posters ...) and counters
+        self.stats = StageTimer()
 
     def maintenance(self):
         """some maintenance on database"""
@@ -96,10 +211,34 @@ class Command(BaseCommand):
             if fname.isdigit():
                 return MovieFile.objects.get(pk=fname)
             else:
-                return MovieFile.objects.get(file__iexact=fname)
+                return MovieFile.objects.with_file(fname).get()
         except ObjectDoesNotExist:
             return None
 
+    def prefetch_files(self, thepath):
+        """load once in memory the database files under path (file or directory)"""
+        if os.path.isfile(thepath):
+            thepath, _ = os.path.split(thepath)
+        prefix = normalize_dbfilename(build_dbfilename(thepath, self.volumes))
+        prefix = prefix.rstrip("\\") + "\\"
+        if any(prefix.startswith(known) for known in self.known_prefixes):
+            return
+        self.known_prefixes.append(prefix)
+        for idfile, fname, status in MovieFile.objects.in_directory(
+            prefix, recurs=True
+        ).values_list("id", "file", "file_status"):
+            self.known_files[normalize_dbfilename(fname)] = (idfile, status)
+
+    def known_file(self, dbfname):
+        """return (id, status) if file in database, else None"""
+        key = normalize_dbfilename(dbfname)
+        if key in self.known_files:
+            return self.known_files[key]
+        if any(key.startswith(prefix) for prefix in self.known_prefixes):
+            return None
+        movie = self.get_moviefile(dbfname)
+        return (movie.id, movie.file_status) if movie else None
+
     def add_or_update_moviedesc(self, moviedesc):
         """
         Add or update Movie entry
@@ -122,8 +261,58 @@ class Command(BaseCommand):
             movie.date_added = make_aware(datetime.now())
         if not self.options["simu"]:
             movie.save()
+            if moviedesc.genre_list is not None:
+                movie.genre_list.set(self.get_genres(moviedesc.genre_list))
+            if moviedesc.countries is not None:
+                movie.country_list.set(self.get_countries(moviedesc.countries))
         return movie
 
+    @staticmethod
+    def get_genres(genre_list):
+        """
+        Genre entries of TMDB genres, added if needed
+            genre_list : [(TMDB id, name)]
+        """
+        genres = []
+        for id_tmdb, name in genre_list:
+            genre = Genre.objects.filter(id_tmdb=id_tmdb).first()
+            named = Genre.objects.filter(name=name).exclude(id_tmdb=id_tmdb).first()
+            if named and named.id_tmdb is None:
+                # genres taken from former genres strings have no TMDB id
+                if genre:
+                    genre.movies.add(*named.movies.all())
+                    named.delete()
+                else:
+                    genre = named
+            elif named:
+                # name of another TMDB genre renamed since : name freed
+                named.name = f"{named.name} ({named.id_tmdb})"
+                named.save()
+            if not genre:
+                genre = Genre.objects.create(id_tmdb=id_tmdb, name=name)
+            elif (genre.id_tmdb, genre.name) != (id_tmdb, name):
+                genre.id_tmdb = id_tmdb
+                genre.name = name
+                genre.save()
+            genres.append(genre)
+        return genres
+
+    @staticmethod
+    def get_countries(countries):
+        """
+        Country entries of production countries, added if needed
+            countries : iso_3166_1 codes string (e.g. "FR, BE")
+        """
+        codes = [code.strip() for code in countries.split(",") if code.strip()]
+        known = Country.objects.in_bulk(codes)
+        for code in codes:
+            if code not in known:
+                country = pycountry.countries.get(alpha_2=code)
+                known[code] = Country.objects.create(
+                    code=code, name=country.name if country else code
+                )
+        return [known[code] for code in codes]
+
     def add_or_update_moviefile(
         self,
         fname,
@@ -134,12 +323,15 @@ class Command(BaseCommand):
         screen_size,
         duration,
         movie_desc,
+        fingerprint=None,
     ):
         """
         Add or update Movie entry
         """
-        movie = self.get_moviefile(fname)
-        if not movie:
+        known = self.known_file(fname)
+        if known:
+            movie = MovieFile.objects.get(pk=known[0])
+        else:
             movie = MovieFile(file=fname)
         movie.file_status = status
         movie.file_size = file_size
@@ -148,47 +340,45 @@ class Command(BaseCommand):
         movie.screen_size = screen_size
         movie.duration = duration
         movie.movie = movie_desc
+        if fingerprint:
+            movie.fingerprint = fingerprint
 
         if not movie.date_added:
             movie.date_added = make_aware(datetime.now())
         if not self.options["simu"]:
             movie.save()
+            self.known_files[normalize_dbfilename(movie.file)] = (movie.id, status)
+            if fingerprint and self.fingerprints is not None:
+                self.fingerprints[fingerprint] = movie.id
         return movie
 
-    def add_or_update_team(self, movie):
+    def add_or_update_streams(self, moviefile, container):
         """
-        Add or update team in database
+        Replace streams of movie file
+            container : ffmpeg probe
         """
-        if self.options["force_parsing"]:
-            for team in Team.objects.filter(movie_id=movie.id):
-                if not self.options["simu"]:
-                    team.delete()
-        creds = self.tmdb.movie.credits(movie.id_tmdb)
-        job, created = Job.objects.get_or_create(name="Actor")
-        if created:
-            job.save()
-
-        for cast in creds.cast:
-            person, created = Person.objects.get_or_create(
-                name=cast.name, id_tmdb=cast.id
-            )
-            if created:
-                person.url_img = cast.profile_path
-                if not person.url_img:
-                    images = self.tmdb.person.images(person.id_tmdb)
-                    if images.profiles:
-                        person.url_img = images.profiles[-1].file_path
-                person.save()
-
-            if self.options["simu"]:
-                continue
-            team, created = Team.objects.get_or_create(
-                movie=movie, person=person, job=job
-            )
-            team.extension = cast.character
-            team.cast_order = cast.order
-            team.save()
+        if self.options["simu"]:
+            return
+        moviefile.streams.all().delete()
+        Stream.objects.bulk_create(
+            [
+                Stream(moviefile=moviefile, **stream)
+                for stream in stream_infos(container)
+            ]
+        )
+
+    @staticmethod
+    def copy_streams(source_id, moviefile):
+        """copy streams of movie file source_id to moviefile (copied file)"""
+        streams = list(Stream.objects.filter(moviefile_id=source_id))
+        for stream in streams:
+            stream.pk = None
+            stream.moviefile = moviefile
+        Stream.objects.bulk_create(streams)
 
+    def team_credits(self, creds):
+        """list of (job name, TMDB credit) to store from TMDB movie credits"""
+        entries = [("Actor", cast) for cast in creds.cast]
         for crew in creds.crew:
             if crew.job in ["Writer", "Original Film Writer"]:
                 jobname = "Writer"
@@ -203,76 +393,265 @@ class Command(BaseCommand):
                 jobname = crew.job
             else:
                 continue
+            entries.append((jobname, crew))
+        return entries
 
-            job, created = Job.objects.get_or_create(name=jobname)
-            if created:
-                job.save()
+    def add_or_update_team(self, movie, credits=None):
+        """
+        Add or update team in database
+            credits : TMDB movie credits if already known (from details)
+            Persons and Teams are read and written in bulk, in one transaction
+        """
+        creds = credits if credits else self.tmdb.movie.credits(movie.id_tmdb)
+        entries = self.team_credits(creds)
+        if self.options["simu"]:
+            return
 
-            if self.options["simu"]:
-                continue
-            person, created = Person.objects.get_or_create(
-                name=crew.name, id_tmdb=crew.id
-            )
-            if created:
-                person.url_img = crew.profile_path
-                if not person.url_img:
-                    images = self.tmdb.person.images(person.id_tmdb)
-                    if images.profiles:
-                        person.url_img = images.profiles[-1].file_path
-                person.save()
-
-            team, created = Team.objects.get_or_create(
-                movie=movie, person=person, job=job
-            )
-            team.cast_order = None
-            team.save()
+        with transaction.atomic():
+            if self.options["force_parsing"]:
+                Team.objects.filter(movie_id=movie.id).delete()
+
+            # jobs
+            jobnames = {jobname for jobname, _ in entries}
+            jobs = {job.name: job for job in Job.objects.filter(name__in=jobnames)}
+            for jobname in jobnames - jobs.keys():
+                jobs[jobname] = Job.objects.create(name=jobname)
+
+            # persons, upsert by TMDB id
+            credits_by_id = {credit.id: credit for _, credit in entries}
+            persons = Person.objects.in_bulk(list(credits_by_id), field_name="id_tmdb")
+            new_persons = []
+            renamed_persons = []
+            for id_tmdb, credit in credits_by_id.items():
+                person = persons.get(id_tmdb)
+                if not person:
+                    # no profile_path : image looked up later (backfill profiles)
+                    new_persons.append(
+                        Person(
+                            name=credit.name,
+                            id_tmdb=id_tmdb,
+                            url_img=credit.profile_path or None,
+                        )
+                    )
+                elif person.name != credit.name:
+                    person.name = credit.name
+                    renamed_persons.append(person)
+            if new_persons:
+                Person.objects.bulk_create(new_persons)
+                persons = Person.objects.in_bulk(
+                    list(credits_by_id), field_name="id_tmdb"
+                )
+            if renamed_persons:
+                Person.objects.bulk_update(renamed_persons, ["name"])
 
-    def add_or_update_poster(self, movie, original_language):
+            # teams
+            teams = {
+                (team.job_id, team.person_id): team
+                for team in Team.objects.filter(movie=movie)
+            }
+            new_teams = {}
+            updated_teams = {}
+            for jobname, credit in entries:
+                job = jobs[jobname]
+                person = persons[credit.id]
+                key = (job.id, person.id)
+                if key in teams:
+                    team = updated_teams[key] = teams[key]
+                elif key in new_teams:
+                    team = new_teams[key]
+                else:
+                    team = new_teams[key] = Team(movie=movie, person=person, job=job)
+                if jobname == "Actor":
+                    team.extension = credit.character
+                    team.cast_order = credit.order
+                else:
+                    team.cast_order = None
+            Team.objects.bulk_create(new_teams.values())
+            Team.objects.bulk_update(updated_teams.values(), ["extension", "cast_order"])
+
+    def prepare_posters(self, moviedesc):
         """
-        Add or update movie poster
+        Select and download posters of movie before storing it (no transaction open
+        during network requests)
+            return (posters contents [(url, content)], number of posters deferred),
+            contents is None if posters are already in database
         """
-        posters = Poster.objects.filter(movie_id=movie.id)
-        if len(posters) > 0:
-            if self.options["force_parsing"]:
-                for poster in posters:
-                    if not self.options["simu"]:
-                        poster.delete()
-                        if os.path.exists(poster.poster.path):
-                            os.remove(poster.poster.path)
-            else:
-                print("  Posters already in datadase")
-                return
-        images = self.tmdb.movie.images(movie.id_tmdb)
+        movie = Movie.objects.filter(id_tmdb=moviedesc.id_tmdb).first()
+        if movie and movie.poster.exists() and not self.options["force_parsing"]:
+            print("  Posters already in datadase")
+            return None, 0
+        urls = self.select_posters(
+            moviedesc.id_tmdb, moviedesc.original_language, moviedesc.details.images
+        )
+        return self.fetch_posters(urls)
+
+    def add_or_update_poster(self, movie, contents, deferred):
+        """
+        Add or update movie posters (in store transaction)
+            contents, deferred : posters contents and number of posters deferred
+            from prepare_posters
+        """
+        if contents is None or self.options["simu"]:
+            return
+        if not self.options["force_parsing"] and movie.poster.exists():
+            # stored meanwhile by another file of movie (group commit)
+            return
+        replaced = set()
+        if self.options["force_parsing"]:
+            for poster in Poster.objects.filter(movie_id=movie.id):
+                poster.delete()
+                if poster.poster:
+                    # removed on commit before new files are written
+                    replaced.add(poster.poster.name)
+                    transaction.on_commit(
+                        lambda path=poster.poster.path: os.path.exists(path)
+                        and os.remove(path)
+                    )
+        self.save_posters(movie, contents, replaced=replaced)
+        self.set_posters_deferred(movie, deferred)
+
+    def complete_posters(self, movie):
+        """
+        Download posters of movie not yet stored
+            return number of posters deferred
+        """
+        with self.stats.stage("posters", movie.title):
+            urls = self.select_posters(movie.id_tmdb, movie.language)
+            known = set(movie.poster.values_list("url_tmdb", flat=True))
+            urls = [url for url in urls if url not in known]
+            contents, deferred = [], 0
+            if urls:
+                print(f'"{movie.title}" ({movie.release_year}) : {len(urls)} posters')
+                contents, deferred = self.fetch_posters(urls)
+            if not self.options["simu"]:
+                with transaction.atomic():
+                    self.save_posters(movie, contents, first_num=len(known) + 1)
+                    self.set_posters_deferred(movie, deferred)
+            return deferred
+
+    @staticmethod
+    def set_posters_deferred(movie, deferred):
+        """record if movie has posters to download later"""
+        if movie.posters_deferred != bool(deferred):
+            movie.posters_deferred = bool(deferred)
+            movie.save(update_fields=["posters_deferred"])
+
+    def select_posters(self, id_tmdb, original_language, images=None):
+        """
+        return urls of TMDB posters to import (settings.MAX_POSTERS at most)
+            images : TMDB movie images if already known (from details)
+        """
+        if images:
+            # images in several languages : prefer TMDb language
+            language = self.tmdb.tmdb.language.split("-")[0]
+            posters = [
+                poster
+                for poster in images["posters"]
+                if poster.get("iso_639_1") == language
+            ]
+            images = {"posters": posters if posters else images["posters"]}
+        else:
+            images = self.tmdb.movie.images(id_tmdb)
         if not images["posters"]:
             # no result : try original language + english + no language
             images = self.tmdb.movie.images(
-                movie.id_tmdb, include_image_language=original_language + ",en,null"
+                id_tmdb, include_image_language=original_language + ",en,null"
             )
             if not images["posters"]:
                 print("  None TMDB posters")
-                return
+                return []
         if len(images["posters"]) > settings.MAX_POSTERS:
             print(
                 f"  Ignore {len(images['posters']) - settings.MAX_POSTERS} on {len(images['posters'])}"
             )
-        for num, poster in enumerate(images["posters"][: settings.MAX_POSTERS]):
+        return [
+            f'{self.tmdb.config["images"]["base_url"]}{"w500"}{poster["file_path"]}'
+            for poster in images["posters"][: settings.MAX_POSTERS]
+        ]
+
+    def fetch_posters(self, urls):
+        """
+        Download posters concurrently
+            downloads not finished after settings.POSTER_DOWNLOAD_BUDGET seconds are
+            abandoned : these posters are fetched later by "manage.py backfill posters"
+            return (posters contents [(url, content)], number of posters deferred)
+        """
+        if self.options["simu"] or not urls:
+            return [], 0
+
+        def download(url):
+            # timeouts and reads bounded by time left in budget
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout("download time exceeded")
+            connect, read = settings.POSTER_DOWNLOAD_TIMEOUT
+            with session.get(
+                url,
+                timeout=(min(connect, remaining), min(read, remaining)),
+                stream=True,
+            ) as req:
+                req.raise_for_status()
+                chunks = []
+                for chunk in req.iter_content(chunk_size=8192):
+                    if time.monotonic() > deadline:
+                        raise requests.Timeout("download time exceeded")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+
+        session = get_http_session()
+        deadline = time.monotonic() + settings.POSTER_DOWNLOAD_BUDGET
+        executor = ThreadPoolExecutor(max_workers=settings.POSTER_DOWNLOAD_JOBS)
+        futures = {executor.submit(download, url): num for num, url in enumerate(urls)}
+        done, not_done = wait(futures, timeout=settings.POSTER_DOWNLOAD_BUDGET)
+        # running downloads end by themselves at deadline
+        executor.shutdown(wait=True, cancel_futures=True)
+        contents = []
+        for future in sorted(done, key=futures.get):
             try:
-                rel_path = poster["file_path"]
-                url = f'{self.tmdb.config["images"]["base_url"]}{"w500"}{rel_path}'
-                req = requests.get(url, timeout=60)
-                # Warning : jpg format forced, must be :
-                #   filetype = rq.headers['content-type'].split('/')[-1]
-                filename = f"{movie.release_year}/{movie.title}_{num + 1}.jpg"
-                poster = Poster(movie=movie, url_tmdb=url)
-                if not self.options["simu"]:
-                    poster.poster.save(filename, ContentFile(req.content))
+                contents.append((urls[futures[future]], future.result()))
+            except requests.RequestException as _e:
+                print(f"  FAILED to download poster : {_e}")
+        if not_done:
+            print(f"  {len(not_done)} posters deferred (download time exceeded)")
+        return contents, len(not_done)
+
+    @staticmethod
+    def save_posters(movie, contents, first_num=1, replaced=()):
+        """
+        Add Poster entries of downloaded posters (in a transaction)
+            images files are written once transaction committed (no orphan files
+            on rollback)
+            replaced : names of posters files deleted on commit, reused
+        """
+
+        def write_image(poster, content):
+            storage = poster.poster.storage
+            name = storage.save(poster.poster.name, ContentFile(content))
+            if name != poster.poster.name:
+                Poster.objects.filter(pk=poster.pk).update(poster=name)
+
+        for num, (url, content) in enumerate(contents):
+            # Warning : jpg format forced, must be :
+            #   filetype = rq.headers['content-type'].split('/')[-1]
+            filename = f"{movie.release_year}/{movie.title}_{first_num + num}.jpg"
+            poster = Poster(movie=movie, url_tmdb=url)
+            name = poster.poster.field.generate_filename(poster, filename)
+            if name not in replaced:
+                name = poster.poster.storage.get_available_name(name)
+            poster.poster.name = name
+            try:
+                with transaction.atomic():
                     poster.save()
             except IntegrityError as _e:
                 print(_e)
                 continue
+            transaction.on_commit(
+                lambda poster=poster, content=content: write_image(poster, content)
+            )
 
-    def parse_file(self, fname):
-        """Parse movie file"""
+    @staticmethod
+    def skipped_extension(fname):
+        """return file extension if not a movie file, else None"""
         _, ext = os.path.splitext(fname)
         if ext.lower() in [
             ".srt",
@@ -282,24 +661,146 @@ class Command(BaseCommand):
             ".idx",
             ".nfo",
         ]:
+            return ext
+        return None
+
+    def check_file(self, fname):
+        """
+        Check if file must be parsed
+            return database filename, or None if file is skipped
+        """
+        ext = self.skipped_extension(fname)
+        if ext:
             if self.options["verbosity"] > 1:
                 print("Skip extension", ext)
-            return
+            return None
 
+        self.stats.count("files")
         dbfname = build_dbfilename(fname, self.volumes)
 
         if not self.options["force_parsing"]:
             # check if movie already in database
-            movie = self.get_moviefile(dbfname)
-            if movie:
+            known = self.known_file(dbfname)
+            if known:
+                self.stats.count("known")
                 if not self.options["silent_exists"]:
                     print(f'Parse file "{fname}" :  ALREADY in database')
-                    # print(f"  ->  {movie.movie.title} (format : {movie.movie_format})")
                 # set status 'OK' if necessary
-                if movie.file_status != "OK":
-                    movie.file_status = "OK"
-                    movie.save()
+                idfile, status = known
+                if status != "OK":
+                    MovieFile.objects.filter(pk=idfile).update(file_status="OK")
+                    self.known_files[normalize_dbfilename(dbfname)] = (idfile, "OK")
+                return None
+            if (
+                self.options.get("queue")
+                and normalize_dbfilename(dbfname) in self.pending_files
+            ):
+                if not self.options["silent_exists"]:
+                    print(f'Parse file "{fname}" :  PENDING in matches queue')
+                return None
+        return dbfname
+
+    def load_fingerprints(self):
+        """load fingerprints of database files"""
+        self.fingerprints = dict(
+            MovieFile.objects.filter(fingerprint__isnull=False).values_list(
+                "fingerprint", "id"
+            )
+        )
+
+    def probe_file(self, fname):
+        """
+        fingerprint and ffprobe file, with timeout (run in worker threads)
+            both are cached : an unchanged file is neither read nor probed
+            return (fingerprint, ffprobe result), ffprobe result is None for a file
+            known by its fingerprint (moved or copied file)
+        """
+        with self.stats.stage("fingerprint", fname):
+            try:
+                fingerprint = cached_fingerprint(fname, self.probe_cache)
+            except OSError:
+                fingerprint = None
+        if (
+            fingerprint
+            and self.fingerprints
+            and fingerprint in self.fingerprints
+            and not self.options["force_parsing"]
+        ):
+            return fingerprint, None
+        with self.stats.stage("probe", fname):
+            return fingerprint, ffprobe(
+                file_path=fname,
+                timeout=self.options["probe_timeout"],
+                cache=self.probe_cache,
+            )
+
+    def parse_file(self, fname):
+        """Parse movie file"""
+        if self.resumed(fname):
+            return
+        dbfname = self.check_file(fname)
+        if not dbfname:
+            return
+        self.process_file(fname, dbfname, *self.probe_file(fname))
+
+    def relocate_file(self, fname, dbfname, fingerprint):
+        """
+        Store a file known by its fingerprint, without probing nor TMDB search
+            moved file (previous file missing, its volume mounted) : database entry
+            is repointed
+            copied file : database entry is cloned
+            return False if fingerprint entry has been removed meanwhile
+        """
+        try:
+            moviefile = MovieFile.objects.get(pk=self.fingerprints[fingerprint])
+        except ObjectDoesNotExist:
+            del self.fingerprints[fingerprint]
+            return False
+        source = moviefile.file
+        # source volume offline : file can't be known as moved, cloned
+        moved = volume_mounted(source, self.volumes) and not os.path.exists(
+            build_osfilename(source, self.volumes)
+        )
+        print(
+            f'Parse file "{fname}" :  {"MOVED from" if moved else "COPY of"} "{source}"'
+        )
+        if self.options["show_only"] or self.options["simu"]:
+            return True
+        source_id = moviefile.id
+        if not moved:
+            # clone : new entry with same datas
+            moviefile.pk = None
+            moviefile.date_added = make_aware(datetime.now())
+        moviefile.file = dbfname
+        moviefile.file_status = "OK"
+
+        def write():
+            with self.stats.stage("db", dbfname), transaction.atomic():
+                moviefile.save()
+                if moved:
+                    self.known_files.pop(normalize_dbfilename(source), None)
+                else:
+                    self.copy_streams(source_id, moviefile)
+                    if moviefile.movie:
+                        moviefile.movie.files.add(moviefile)
+            self.known_files[normalize_dbfilename(dbfname)] = (moviefile.id, "OK")
+            self.stats.count("moved" if moved else "copied")
+            self.checkpoint(dbfname, "done")
+
+        self.group_write(write)
+        return True
+
+    def process_file(self, fname, dbfname, fingerprint, ffprobe_result, search=None):
+        """
+        Search movie in TMDB and store in database from ffprobe result
+            fingerprint : file fingerprint
+            ffprobe_result : None for a moved or copied file (known fingerprint)
+            search : Future of TMDB search started in advance (filling TMDB cache)
+        """
+        if ffprobe_result is None:
+            if self.relocate_file(fname, dbfname, fingerprint):
                 return
+            fingerprint, ffprobe_result = self.probe_file(fname)
 
         print(
             f'Parse file "{fname}"',
@@ -307,11 +808,12 @@ class Command(BaseCommand):
         )
 
         # parse ffmpeg
-        ffprobe_result = ffprobe(file_path=fname)
         if ffprobe_result.return_code != 0:
             print("ERROR")
             print(ffprobe_result.error, file=sys.stderr)
+            self.checkpoint(dbfname, "skipped")
             return
+        self.checkpoint(dbfname, "probed")
         # add smart infos to original ffmpeg probe
         container = smart_probe(json.loads(ffprobe_result.json))
         fmt = container["format"]
@@ -326,28 +828,34 @@ class Command(BaseCommand):
             # set TMDB id on unique file
             if not (self.ndirectories == 0 and self.nfiles == 1):
                 sys.exit('FAILED: Specify only ONE movie when using option "--set-id"')
-            movies = [MovieDescription.from_id(self.tmdb.movie, self.options["set_id"])]
+            with self.stats.stage("search", dbfname):
+                movies = [
+                    MovieDescription.from_id(self.tmdb.movie, self.options["set_id"])
+                ]
         else:
             # standard search
-            _, moviename = os.path.split(fname)
-            moviename, _ = os.path.splitext(moviename)
-            # get optionnal year after title (ex: "Hollow man.2000")
-            year = None
-            words = moviename.split(".")
-            if len(words) > 1:
-                for _id in range(len(words) - 1, 0, -1):
-                    year = words[_id]
-                    if year.isnumeric() and int(year) > 1900 and int(year) < 2100:
-                        moviename = " ".join(words[:_id])
-                        break
-            # replace various characters
-            moviename = moviename.replace(".", " ").replace("_", " ")
-            # and research in TBDB
-            movies = MovieDescription.from_search(
-                self.tmdb.search, moviename, year=year
+            moviename, year = title_year_from_filename(fname)
+            stage, id_tmdb = (
+                self.journal.stage(dbfname) if self.journal else (None, None)
             )
+            if stage != "matched":
+                id_tmdb = self.memo_match(moviename, year)
+            with self.stats.stage("search", dbfname):
+                movies = None
+                if id_tmdb:
+                    # title already resolved
+                    print(f"  MEMO MATCH TMDB id {id_tmdb}")
+                    movies = self.memo_movies(id_tmdb, moviename, year)
+                if movies is None:
+                    if search:
+                        wait([search])
+                    # and research in TBDB
+                    movies = MovieDescription.from_search(
+                        self.tmdb.search, moviename, year=year
+                    )
         if len(movies) == 0:
             print(f'  NO SUGGESTIONS for "{fname}"')
+            self.checkpoint(dbfname, "skipped")
             return
         if len(movies) > 1:
             # check if exact exist in list
@@ -369,7 +877,31 @@ class Command(BaseCommand):
                     movies = exact_movies
                 if len(movies) == 0:
                     print(f'  NO SUGGESTIONS (with --exact-name) for "{fname}"')
+                    self.checkpoint(dbfname, "skipped")
                     return
+        if len(movies) > 1 and not self.options["show_only"]:
+            # try automatic choice
+            skipped = []
+            with self.stats.stage("match", dbfname):
+                movie, score = best_candidate(
+                    self.tmdb.movie, movies, moviename, year, container, skipped
+                )
+            for candidate, error in skipped:
+                print(f'  Candidate "{candidate.title}" skipped : {error}')
+            if movie:
+                print(
+                    f"  AUTO MATCH {movie.title} [year: {movie.release_date}]"
+                    f" (score {score:.2f})"
+                )
+                movies = [movie]
+        if (
+            len(movies) > 1
+            and self.options.get("queue")
+            and not self.options["show_only"]
+        ):
+            self.queue_match(dbfname, ffprobe_result.json, movies)
+            self.checkpoint(dbfname, "skipped")
+            return
         if len(movies) > 1 and not self.options["show_only"]:
             for num, moviedesc in enumerate(movies):
                 original_title = (
@@ -389,6 +921,7 @@ class Command(BaseCommand):
 
         if len(movies) > 1 and not self.options["show_only"]:
             if self.options["skip_choosing"]:
+                self.checkpoint(dbfname, "skipped")
                 return
             while True:
                 try:
@@ -397,6 +930,7 @@ class Command(BaseCommand):
                     )
                     sel = input()
                     if not sel:
+                        self.checkpoint(dbfname, "skipped")
                         return
                     sel = int(sel) - 1
                     if sel >= 0 and sel < len(movies):
@@ -417,56 +951,405 @@ class Command(BaseCommand):
         # save movie in db
         #
         print("  ", "Simulates" if self.options["simu"] else "", "Store in database")
-        # MovieDescription.from_search doesn't return genres/, so update
+        # MovieDescription.from_search doesn't return genres/credits/images, so update
         moviedesc = movies[0]
-        moviedesc.get_full_description(self.tmdb.movie)
-        # create Movie description from TMDB data
-        movie_db = self.add_or_update_moviedesc(moviedesc)
-        self.add_or_update_team(movie_db)
-        self.add_or_update_poster(movie_db, moviedesc.original_language)
-
-        # fix some incorrect screen_size
-        screen_size = fmt["screen_size"]
-        width, height = screen_size.split("x")
-        width = int(width)
-        height = int(height)
-        if width < height:
-            width, height = height, width
-            screen_size = f"{width}x{height}"
+        self.checkpoint(dbfname, "matched", moviedesc.id_tmdb)
+        with self.stats.stage("details", dbfname):
+            moviedesc.get_full_description(self.tmdb.movie)
+        self.store_movie(dbfname, moviedesc, container, fingerprint)
+        self.memorize_match(*title_year_from_filename(fname), moviedesc.id_tmdb)
+
+    def store_movie(self, dbfname, moviedesc, container, fingerprint=None):
+        """
+        Store movie description, team, posters and movie file as one atomic unit
+            moviedesc : full TMDB description (with details)
+            container : smart probe of movie file
+            fingerprint : content fingerprint of movie file
+            return MovieFile (not saved on simulation, None if waiting for group commit)
+        """
+        fmt = container["format"]
+        # network requests before transaction : database not locked meanwhile
+        with self.stats.stage("posters", dbfname):
+            posters, deferred = self.prepare_posters(moviedesc)
+
+        def write():
+            try:
+                with self.stats.stage("db", dbfname), transaction.atomic():
+                    # create Movie description from TMDB data
+                    movie_db = self.add_or_update_moviedesc(moviedesc)
+                    self.add_or_update_team(movie_db, moviedesc.details.credits)
+                    self.add_or_update_poster(movie_db, posters, deferred)
+                    moviefile = self.add_or_update_moviefile(
+                        dbfname,
+                        "OK",
+                        fmt["size"],
+                        f'container: {fmt["format_name"]} | {container["smart_streams"]}',
+                        fmt["bit_rate"],
+                        fmt["screen_size"],
+                        int(float(fmt["duration"])),
+                        movie_db,
+                        fingerprint,
+                    )
+                    self.add_or_update_streams(moviefile, container)
+                    if not self.options["simu"]:
+                        # add moviefile to Movie
+                        moviefile.movie.files.add(moviefile)
+                        # file not waiting anymore for a choice
+                        if (
+                            self.pending_files is None
+                            or normalize_dbfilename(dbfname) in self.pending_files
+                        ):
+                            PendingMatch.objects.filter(
+                                file_key=normalize_dbfilename(dbfname)
+                            ).delete()
+            except Exception:
+                # rolled back : file not in database
+                self.known_files.pop(normalize_dbfilename(dbfname), None)
+                raise
+            self.checkpoint(dbfname, "stored" if deferred else "done")
+            return moviefile
+
+        return self.group_write(write)
+
+    @staticmethod
+    def memo_match(moviename, year):
+        """TMDB id already resolved for title and year, or None"""
+        memo = MatchMemo.objects.filter(
+            title_key=normalize_title(moviename), year=int(year or 0)
+        ).first()
+        return memo.id_tmdb if memo else None
+
+    def memo_movies(self, id_tmdb, moviename, year):
+        """
+        TMDB description of id resolved for title and year, as search result
+            None if id unknown by TMDB (removed or merged) : memo is deleted
+        """
+        try:
+            return [MovieDescription.from_id(self.tmdb.movie, id_tmdb)]
+        except TMDbException as _e:
+            print(f"  TMDB id {id_tmdb} not found ({_e}) : research title")
+            if not self.options.get("simu"):
+                MatchMemo.objects.filter(
+                    title_key=normalize_title(moviename), year=int(year or 0)
+                ).delete()
+            return None
+
+    def memorize_match(self, moviename, year, id_tmdb):
+        """memorize TMDB id resolved for title and year"""
+        if self.options["simu"] or not normalize_title(moviename):
+            return
+        self.group_write(
+            lambda: MatchMemo.objects.update_or_create(
+                title_key=normalize_title(moviename),
+                year=int(year or 0),
+                defaults={"id_tmdb": id_tmdb},
+            ),
+            stored=False,
+        )
 
+    def queue_match(self, dbfname, json_probe, movies):
+        """record file with several TMDB suggestions, to be resolved later"""
+        print(f"  QUEUED with {len(movies)} suggestions")
+        self.stats.count("queued")
         if self.options["simu"]:
             return
-        moviefile = self.add_or_update_moviefile(
-            dbfname,
-            "OK",
-            fmt["size"],
-            f'container: {fmt["format_name"]} | {container["smart_streams"]}',
-            fmt["bit_rate"],
-            screen_size,
-            int(float(fmt["duration"])),
-            movie_db,
+        candidates = [
+            [
+                movie.id_tmdb,
+                movie.title,
+                movie.original_title,
+                movie.release_date,
+                movie.overview,
+                movie.original_language,
+            ]
+            for movie in movies
+        ]
+        PendingMatch.objects.update_or_create(
+            file_key=normalize_dbfilename(dbfname),
+            defaults={
+                "file": dbfname,
+                "probe": json_probe,
+                "candidates": json.dumps(candidates),
+                "date_added": make_aware(datetime.now()),
+            },
         )
-        # add moviefile to Movie
-        moviefile.movie.files.add(moviefile)
+        if self.pending_files is not None:
+            self.pending_files.add(normalize_dbfilename(dbfname))
 
-    def parse_directory(self, thepath):
-        """Parse directory"""
+    def load_pending_files(self):
+        """load pending matches queue filenames"""
+        self.pending_files = set(
+            PendingMatch.objects.values_list("file_key", flat=True)
+        )
+
+    def checkpoint(self, dbfname, stage, data=None):
+        """
+        record stage reached by file in run journal
+            stored files are recorded only once committed (option --commit-every)
+        """
+        self.stats.count(stage)
+        if not self.journal:
+            return
+        if self.group is not None and stage not in ["probed", "matched", "skipped"]:
+            self.checkpoints.append((dbfname, stage, data))
+        else:
+            self.journal.mark(dbfname, stage, data)
+
+    def resumed(self, fname):
+        """
+        True if file already processed in resumed run
+            stored files have their missing posters downloaded
+        """
+        if not self.journal:
+            return False
+        dbfname = build_dbfilename(fname, self.volumes)
+        stage, _ = self.journal.stage(dbfname)
+        if stage == "stored":
+            known = self.known_file(dbfname)
+            if not known:
+                return False
+            print(f'Parse file "{fname}" :  RESUME posters')
+            movie = MovieFile.objects.get(pk=known[0]).movie
+            deferred = self.complete_posters(movie) if movie else 0
+            self.checkpoint(dbfname, "stored" if deferred else "done")
+            return True
+        return stage in FINAL_STAGES
+
+    def open_journal(self, options):
+        """
+        open run journal, for a new run or a resumed run
+            arguments of resumed run replace options
+        """
+        if options["show_only"] or options["simu"]:
+            return
+        self.journal = RunJournal(settings.RUN_JOURNAL)
+        if options["resume"]:
+            run = options["resume"]
+            args = self.journal.resume(run, "movieparsing")
+            if args is None:
+                sys.exit(f"FAILED: unknown run {run}")
+            options.update(args)
+            options["resume"] = run
+            print(f"Resume run {run} ({len(self.journal.stages)} files checkpointed)")
+        else:
+            run = self.journal.start(
+                "movieparsing",
+                {
+                    key: value
+                    for key, value in options.items()
+                    if isinstance(value, (str, int, float, bool, list, type(None)))
+                },
+            )
+            print(f"Run {run} (resume with --resume {run})")
+
+    def begin_group(self):
+        """begin a group of files stored together (option --commit-every)"""
+        self.group = []
+        self.uncommitted = 0
+
+    def group_write(self, write, stored=True):
+        """
+        run database writes of a file : at once, or queued for group commit
+        (option --commit-every)
+            write : function writing datas already fetched (no network request)
+            stored : writes of a stored file, counted for group commit
+            return result of write, None if queued
+        """
+        if self.group is None:
+            return write()
+        self.group.append(write)
+        if stored:
+            self.uncommitted += 1
+            self.commit_group()
+        return None
+
+    def commit_group(self, end=False):
+        """
+        run queued database writes of a group of files in one transaction
+        (option --commit-every) : database locked only while writing
+            a file in error is rolled back alone (savepoint), files queued after it
+            are not stored
+        """
+        if self.group is None:
+            return
+        if end or self.uncommitted >= self.options["commit_every"]:
+            writes, self.group, self.uncommitted = self.group, [], 0
+            error = None
+            if writes:
+                with transaction.atomic():
+                    for write in writes:
+                        try:
+                            with transaction.atomic():
+                                write()
+                        except Exception as _e:
+                            error = _e
+                            break
+            if self.journal:
+                self.journal.mark_many(self.checkpoints)
+            self.checkpoints = []
+            if end:
+                self.group = None
+            if error:
+                raise error
+
+    def parse_files(self, fnames):
+        """
+        Parse files list
+            with option "--jobs", files are probed in a pool of threads and TMDB
+            searches are run in advance by the asyncio client, but TMDB matching and
+            database updates are still done in list order
+        """
+        if self.options["jobs"] <= 1:
+            for fname in fnames:
+                self.parse_file(fname)
+            return
+        # TMDB searches in advance fill the TMDB cache, with asyncio client
+        prefetch = self.tmdb.cache and not self.options["set_id"]
+        if not self.tmdb.cache:
+            print("TMDB searches not run in advance : no TMDB cache (--no-tmdb-cache)")
+        if prefetch:
+            self.tmdb.start_async(
+                rate=settings.TMDB_REQUESTS_PER_SECOND,
+                max_inflight=settings.TMDB_MAX_REQUESTS_IN_FLIGHT,
+            )
+        try:
+            with ThreadPoolExecutor(max_workers=self.options["jobs"]) as executor:
+                pending = deque()
+                for fname in fnames:
+                    if self.resumed(fname):
+                        continue
+                    dbfname = self.check_file(fname)
+                    if not dbfname:
+                        continue
+                    title_year = title_year_from_filename(fname)
+                    search = (
+                        self.tmdb.submit(self.tmdb.aio.search_movies(*title_year))
+                        if prefetch and not self.memo_match(*title_year)
+                        else None
+                    )
+                    probe = executor.submit(self.probe_file, fname)
+                    pending.append((fname, dbfname, probe, search))
+                    # limit the number of probes in advance
+                    while len(pending) > 2 * self.options["jobs"]:
+                        fname, dbfname, probe, search = pending.popleft()
+                        self.process_file(fname, dbfname, *probe.result(), search)
+                while pending:
+                    fname, dbfname, probe, search = pending.popleft()
+                    self.process_file(fname, dbfname, *probe.result(), search)
+        finally:
+            self.tmdb.stop_async()
+
+    def walk_directory(self, thepath):
+        """yield files in directory"""
         print(
             f'Parse directory "{thepath}"{" and subdirectories" if not self.options["no_recurs"] else ""}'
         )
-        for root, _, files in os.walk(thepath):
-            for filename in files:
-                fname = os.path.join(root, filename)
-                self.parse_file(fname)
-            # continue in sub-directories ?
-            if self.options["no_recurs"]:
-                # right when topdown option is True (default)
-                break
+        yield from self.walk_tree(thepath, not self.options["no_recurs"])
+
+    def walk_tree(self, thepath, recurs):
+        """
+        yield files in directory tree
+            a directory unchanged since last scan (same mtime) is not listed, unless
+            options "--full" or "--force-parsing" : its files are skipped and its
+            sub-directories known from last scan are walked (adding, removing or
+            renaming an entry changes the directory mtime, a change in a
+            sub-directory doesn't)
+        """
+        try:
+            mtime = os.stat(thepath).st_mtime
+        except OSError as e:
+            print(f'Directory "{thepath}" : {e}')
+            return
+        directory = normalize_dbfilename(build_dbfilename(thepath, self.volumes))
+        scanned = None
+        if not (self.options.get("full") or self.options["force_parsing"]):
+            scanned = ScannedDirectory.objects.filter(
+                directory=directory, mtime=mtime
+            ).first()
+        if scanned:
+            self.unchanged_dirs += 1
+            if self.options["verbosity"] > 1:
+                print(f'Directory "{thepath}" unchanged since {scanned.date_scanned}')
+            subdirs = json.loads(scanned.subdirs)
+        else:
+            try:
+                with os.scandir(thepath) as it:
+                    entries = list(it)
+            except OSError as e:
+                print(f'Directory "{thepath}" : {e}')
+                return
+            subdirs = sorted(entry.name for entry in entries if entry.is_dir())
+            files = sorted(entry.path for entry in entries if entry.is_file())
+            yield from files
+            self.scanned_dirs.append(
+                (
+                    directory,
+                    mtime,
+                    subdirs,
+                    [
+                        build_dbfilename(fname, self.volumes)
+                        for fname in files
+                        if not self.skipped_extension(fname)
+                    ],
+                )
+            )
+        if recurs:
+            for subdir in subdirs:
+                yield from self.walk_tree(os.path.join(thepath, subdir), recurs)
+
+    def update_scan_journal(self):
+        """
+        save scanned directories in journal
+            only directories whose movie files are all in database, others will
+            be scanned again next time
+        """
+        if self.options["show_only"] or self.options["simu"]:
+            return
+        saved = 0
+        for directory, mtime, subdirs, dbfnames in self.scanned_dirs:
+            if all(self.known_file(dbfname) for dbfname in dbfnames):
+                ScannedDirectory.objects.update_or_create(
+                    directory=directory,
+                    defaults={
+                        "mtime": mtime,
+                        "subdirs": json.dumps(subdirs),
+                        "date_scanned": make_aware(datetime.now()),
+                    },
+                )
+                saved += 1
+        print(
+            f"Directories : {self.unchanged_dirs} unchanged, {len(self.scanned_dirs)} scanned"
+            f" ({len(self.scanned_dirs) - saved} with files not in database)"
+        )
+        self.scanned_dirs = []
+        self.unchanged_dirs = 0
+
+    def parse_directory(self, thepath):
+        """Parse directory"""
+        self.parse_files(self.walk_directory(thepath))
+        self.update_scan_journal()
+
+    def walk_filelist(self, fnames):
+        """yield files from list of files or directories (glob expanded)"""
+        for fname in fnames:
+            if os.path.isfile(fname):
+                self.prefetch_files(fname)
+                yield fname
+            elif os.path.isdir(fname):
+                self.prefetch_files(fname)
+                yield from self.walk_directory(fname)
 
     def open_tmdb(self):
         """open TMBD instances"""
         if not hasattr(self, "tmdb"):
-            self.tmdb = TMDB_Api(settings.TMDB_API_KEY, settings.TMDB_API_LANG)
+            cache = (
+                None
+                if self.options.get("no_tmdb_cache")
+                else tmdb_cache()
+            )
+            self.tmdb = TMDB_Api(
+                settings.TMDB_API_KEY, settings.TMDB_API_LANG, cache=cache
+            )
 
     def handle(self, *args, **options):
         """
@@ -476,12 +1359,14 @@ class Command(BaseCommand):
         """
         locale.setlocale(locale.LC_ALL, "")
 
+        # run journal, can replace options by resumed run ones
+        self.open_journal(options)
+        self.options = options
+
         if len(options["filelist"]) == 0:
             print("FAILED : Need list of files or directories")
             return "FAILED"
 
-        self.options = options
-
         # get mapping letter volumes to volume name
         if platform.system() == "Windows":
             self.volumes = get_volumes()
@@ -489,33 +1374,57 @@ class Command(BaseCommand):
         # prepare TMDb API
         self.open_tmdb()
 
+        # probe results cache
+        self.probe_cache = (
+            None if options["no_probe_cache"] else ProbeCache(settings.PROBE_CACHE)
+        )
+
         # some maintenance code if necessary
         self.maintenance()
 
+        # files waiting for a choice are not parsed again
+        self.load_pending_files()
+        # moved or copied files are recognized by their fingerprint
+        self.load_fingerprints()
+
         # run only on Windows
         if platform.system() != "Windows":
             sys.exit(
                 "Adding movies can be only done on Windows system.\nUse manage_moviesite.py for remote management from Windows."
             )
 
-        # count files in glob
-        self.ndirectories = self.nfiles = 0
-        for glob_name in options["filelist"]:
-            glob_name = glob_name.rstrip("\r\n")
-            for fname in glob.glob(glob_name):
-                if os.path.isfile(fname):
-                    self.nfiles += 1
-                elif os.path.isdir(fname):
-                    self.ndirectories += 1
-
-        # and go jobs
-        for glob_name in options["filelist"]:
-            glob_name = glob_name.rstrip("\r\n")
-            for fname in glob.glob(glob_name):
-                if os.path.isfile(fname):
-                    self.parse_file(fname)
-                elif os.path.isdir(fname):
-                    self.parse_directory(fname)
-                else:
-                    continue
+        # expand glob once, and count files / directories
+        fnames = [
+            fname
+            for glob_name in options["filelist"]
+            for fname in glob.glob(glob_name.rstrip("\r\n"))
+        ]
+        self.nfiles = sum(1 for fname in fnames if os.path.isfile(fname))
+        self.ndirectories = sum(1 for fname in fnames if os.path.isdir(fname))
+
+        # stages timing, from here
+        self.stats = StageTimer(options.get("trace"))
+
+        # group commit : database writes of files queued, and run by group in one
+        # transaction
+        if options["commit_every"] > 1:
+            self.begin_group()
+        try:
+            # and go jobs
+            self.parse_files(self.stats.iterate("walk", self.walk_filelist(fnames)))
+            self.update_scan_journal()
+            if self.journal:
+                self.journal.finish()
+        finally:
+            # files completely processed are stored, even on error or interrupt
+            self.commit_group(end=True)
+            if self.journal:
+                print(self.journal.stats())
+
+        print(self.stats.summary())
+        self.stats.close()
+        if self.probe_cache:
+            print(self.probe_cache.stats())
+        if self.tmdb.cache:
+            print(self.tmdb.cache.stats())
         return None
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Administration : resolve movie files queued with several TMDB suggestions
+
+"""
+
+import json
+import textwrap
+
+from django.core.management.base import BaseCommand
+
+from movie.models import PendingMatch
+from movie.moviedesc import MovieDescription
+from movie.management.commands.movieparsing import Command as ParsingCommand
+from moviedb.ffprobe import smart_probe
+from moviedb.common import title_year_from_filename
+
+
+class Command(BaseCommand):
+    """
+    class Command
+    """
+
+    help = "Choose TMDB movie of files queued by movieparsing --queue, then store them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="only list files waiting for a choice",
+        )
+        parser.add_argument(
+            "--simu",
+            action="store_true",
+            help="don't make any modifications on database",
+        )
+
+    @staticmethod
+    def print_candidates(candidates):
+        """print candidates list"""
+        for num, (_, title, original_title, release_date, overview, _) in enumerate(
+            candidates
+        ):
+            original_title = (
+                f" ({original_title})" if original_title != title else ""
+            )
+            print(f"    {(num + 1):2}- {title}{original_title} [year: {release_date}]")
+            if overview:
+                lines = textwrap.wrap(overview, 120, break_long_words=False)
+                for line in lines:
+                    print("       ", line)
+
+    def choose(self, pendings):
+        """
+        ask choices for all pending files
+            return list of (PendingMatch, TMDB id), None to drop file from queue
+        """
+        choices = []
+        for pending in pendings:
+            candidates = json.loads(pending.candidates)
+            print(f'File "{pending.file}" :')
+            self.print_candidates(candidates)
+            while True:
+                print(
+                    f"Choose a movie number (1 to {len(candidates)}, ENTER to skip,"
+                    " d to drop from queue, q to stop choosing) :"
+                )
+                sel = input()
+                if not sel:
+                    break
+                if sel == "q":
+                    return choices
+                if sel == "d":
+                    choices.append((pending, None))
+                    break
+                try:
+                    sel = int(sel) - 1
+                except ValueError:
+                    continue
+                if 0 <= sel < len(candidates):
+                    choices.append((pending, candidates[sel][0]))
+                    break
+        return choices
+
+    def store(self, choices, simu):
+        """store chosen movies, in one transaction"""
+        parsing = ParsingCommand()
+        parsing.options = {
+            "simu": simu,
+            "force_parsing": False,
+            "commit_every": len(choices) + 1,
+        }
+        if any(id_tmdb for _, id_tmdb in choices):
+            parsing.open_tmdb()
+        parsing.begin_group()
+        try:
+            for pending, id_tmdb in choices:
+                if id_tmdb is None:
+                    print(f'Drop "{pending.file}" from queue')
+                    if not simu:
+                        pending.delete()
+                    continue
+                try:
+                    moviedesc = MovieDescription.from_id(parsing.tmdb.movie, id_tmdb)
+                    print(f'Store "{pending.file}" : {moviedesc.title}')
+                    container = smart_probe(json.loads(pending.probe))
+                    parsing.store_movie(pending.file, moviedesc, container)
+                    parsing.memorize_match(
+                        *title_year_from_filename(pending.file), id_tmdb
+                    )
+                except Exception as _e:
+                    print(f'  FAILED to store "{pending.file}" : {_e}')
+        finally:
+            parsing.commit_group(end=True)
+
+    def handle(self, *args, **options):
+        """
+        Handle command
+
+            Warning : must return None or string, else Exception
+        """
+        pendings = PendingMatch.objects.order_by("file")
+        print(f"{len(pendings)} files waiting for a choice")
+        if options["list"]:
+            for pending in pendings:
+                print(f"  {pending}")
+            return None
+
+        choices = self.choose(pendings)
+        if choices:
+            self.store(choices, options["simu"])
+        return None
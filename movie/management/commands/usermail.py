@@ -79,9 +79,8 @@ class Command(BaseCommand):
 
         # list of new movies for the week
         date_from = datetime.now() - timedelta(days=options["days"])
-        movies = MovieFile.objects.filter(
+        movies = MovieFile.objects.on_volume(settings.MAIN_VOLUME[0]).filter(
             file_status="OK",
-            file__istartswith=settings.MAIN_VOLUME[0],
             date_added__gte=make_aware(date_from),
         ).order_by("movie__title")
 
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie', '0002_job_person_alter_team_options_remove_movie_bitrate_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScannedDirectory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('directory', models.TextField(unique=True)),
+                ('mtime', models.FloatField()),
+                ('subdirs', models.TextField(default='[]')),
+                ('date_scanned', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='job',
+            options={'ordering': ('name',)},
+        ),
+    ]
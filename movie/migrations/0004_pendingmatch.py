@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0003_scanneddirectory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingMatch",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file", models.TextField(unique=True)),
+                ("probe", models.TextField()),
+                ("candidates", models.TextField()),
+                ("date_added", models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:01
+
+import re
+
+import unidecode
+from django.db import migrations, models
+
+
+def normalize_title(title):
+    """same as movie.moviedesc.normalize_title"""
+    return " ".join(re.findall(r"[a-z0-9]+", unidecode.unidecode(title).lower()))
+
+
+def seed_memo(apps, schema_editor):
+    """
+    seed memo with movies in database : titles with year
+        - no key without year : a filename without year could be another movie
+          with the same title, not yet in database
+        - ambiguous keys (several TMDB ids) are ignored
+    """
+    Movie = apps.get_model("movie", "Movie")
+    MatchMemo = apps.get_model("movie", "MatchMemo")
+    memo = {}
+    for title_ai, original_title, year, id_tmdb in Movie.objects.filter(
+        id_tmdb__isnull=False
+    ).values_list("title_ai", "original_title", "release_year", "id_tmdb"):
+        for title in [title_ai, original_title]:
+            key = normalize_title(title or "")
+            if not key:
+                continue
+            memo.setdefault((key, year or 0), set()).add(id_tmdb)
+    MatchMemo.objects.bulk_create(
+        [
+            MatchMemo(title_key=key, year=year, id_tmdb=ids.pop())
+            for (key, year), ids in memo.items()
+            if len(ids) == 1
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0004_pendingmatch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MatchMemo",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("title_key", models.TextField()),
+                ("year", models.IntegerField(default=0)),
+                ("id_tmdb", models.IntegerField()),
+            ],
+            options={
+                "unique_together": {("title_key", "year")},
+            },
+        ),
+        migrations.RunPython(seed_memo, migrations.RunPython.noop),
+    ]
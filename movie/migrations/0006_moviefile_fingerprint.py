@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0005_matchmemo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moviefile",
+            name="fingerprint",
+            field=models.TextField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:09
+
+import ntpath
+
+from django.db import migrations, models
+
+
+def fill_volume_directory(apps, schema_editor):
+    """set volume and directory of files (same as MovieFile.save)"""
+    MovieFile = apps.get_model("movie", "MovieFile")
+    moviefiles = []
+    for moviefile in MovieFile.objects.only("file").iterator():
+        dbfname = moviefile.file.replace("/", "\\").lower()
+        label, sep, _ = dbfname.partition(":")
+        moviefile.volume = label if sep else ""
+        moviefile.directory = ntpath.dirname(dbfname)
+        moviefiles.append(moviefile)
+    MovieFile.objects.bulk_update(moviefiles, ["volume", "directory"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0006_moviefile_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moviefile",
+            name="directory",
+            field=models.TextField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="moviefile",
+            name="volume",
+            field=models.TextField(db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_volume_directory, migrations.RunPython.noop),
+    ]
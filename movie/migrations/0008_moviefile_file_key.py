@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+def fill_file_key(apps, schema_editor):
+    """
+    set normalized path of files (same as MovieFile.save)
+        files differing only by case or separator must be fixed before migration
+    """
+    MovieFile = apps.get_model("movie", "MovieFile")
+    moviefiles = []
+    files = {}
+    for moviefile in MovieFile.objects.only("file").iterator():
+        moviefile.file_key = moviefile.file.replace("/", "\\").lower()
+        files.setdefault(moviefile.file_key, []).append(moviefile.file)
+        moviefiles.append(moviefile)
+    collisions = [names for names in files.values() if len(names) > 1]
+    if collisions:
+        raise RuntimeError(
+            "Files differing only by case or separator, remove duplicates : "
+            + "; ".join(" | ".join(names) for names in collisions)
+        )
+    MovieFile.objects.bulk_update(moviefiles, ["file_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0007_moviefile_volume_directory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moviefile",
+            name="file_key",
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_file_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="moviefile",
+            name="file_key",
+            field=models.TextField(editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+def fill_genres(apps, schema_editor):
+    """genres of movies taken from genres strings (e.g. "Comédie, Drame")"""
+    Movie = apps.get_model("movie", "Movie")
+    Genre = apps.get_model("movie", "Genre")
+    MovieGenre = Movie.genre_list.through
+    movie_genres = []
+    for idmovie, genres in Movie.objects.values_list("id", "genres"):
+        for name in (genres or "").split(","):
+            name = name.strip()
+            if name:
+                movie_genres.append((idmovie, name))
+    names = sorted({name for _, name in movie_genres})
+    Genre.objects.bulk_create([Genre(name=name) for name in names])
+    genres = dict(Genre.objects.values_list("name", "id"))
+    MovieGenre.objects.bulk_create(
+        [
+            MovieGenre(movie_id=idmovie, genre_id=genres[name])
+            for idmovie, name in set(movie_genres)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0008_moviefile_file_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Genre",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField(unique=True)),
+                ("id_tmdb", models.IntegerField(null=True, unique=True)),
+            ],
+            options={
+                "ordering": ("name",),
+            },
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="genre_list",
+            field=models.ManyToManyField(related_name="movies", to="movie.genre"),
+        ),
+        migrations.RunPython(fill_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:11
+
+import pycountry
+from django.db import migrations, models
+
+
+def fill_countries(apps, schema_editor):
+    """production countries of movies taken from countries strings (e.g. "FR, BE")"""
+    Movie = apps.get_model("movie", "Movie")
+    Country = apps.get_model("movie", "Country")
+    MovieCountry = Movie.country_list.through
+    movie_countries = set()
+    for idmovie, countries in Movie.objects.values_list("id", "countries"):
+        for code in (countries or "").split(","):
+            code = code.strip()
+            if code:
+                movie_countries.add((idmovie, code))
+    countries = []
+    for code in sorted({code for _, code in movie_countries}):
+        country = pycountry.countries.get(alpha_2=code)
+        countries.append(Country(code=code, name=country.name if country else code))
+    Country.objects.bulk_create(countries)
+    MovieCountry.objects.bulk_create(
+        [
+            MovieCountry(movie_id=idmovie, country_id=code)
+            for idmovie, code in movie_countries
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0009_genre"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Country",
+            fields=[
+                ("code", models.TextField(primary_key=True, serialize=False)),
+                ("name", models.TextField()),
+            ],
+            options={
+                "ordering": ("name",),
+            },
+        ),
+        migrations.AlterField(
+            model_name="movie",
+            name="language",
+            field=models.TextField(blank=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="movie",
+            name="country_list",
+            field=models.ManyToManyField(related_name="movies", to="movie.country"),
+        ),
+        migrations.RunPython(fill_countries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def parse_movie_format(movie_format):
+    """
+    streams of movie_format string (see smart_probe) : [(kind, codec, language)]
+        e.g. "container: matroska,webm | video: h264  | audio: ac3 (fre), aac (eng)"
+    """
+    streams = []
+    for part in (movie_format or "").split(" | "):
+        kind, sep, codecs = part.partition(":")
+        kind = kind.strip()
+        if not sep or kind not in ["video", "audio", "subtitle"]:
+            continue
+        for codec in codecs.split(", "):
+            codec, _, language = codec.strip().partition(" (")
+            language = language.rstrip(")").lower()
+            streams.append(
+                (
+                    kind,
+                    codec or None,
+                    language if language not in ["", "und"] else None,
+                )
+            )
+    return streams
+
+
+def fill_streams(apps, schema_editor):
+    """streams of movie files taken from movie_format strings (no probe)"""
+    MovieFile = apps.get_model("movie", "MovieFile")
+    Stream = apps.get_model("movie", "Stream")
+    streams = []
+    for idfile, movie_format, screen_size in MovieFile.objects.values_list(
+        "id", "movie_format", "screen_size"
+    ):
+        width, _, height = (screen_size or "").partition("x")
+        for kind, codec, language in parse_movie_format(movie_format):
+            video = kind == "video"
+            streams.append(
+                Stream(
+                    moviefile_id=idfile,
+                    kind=kind,
+                    codec=codec,
+                    language=language,
+                    width=int(width) if video and width.isdigit() else None,
+                    height=int(height) if video and height.isdigit() else None,
+                )
+            )
+    Stream.objects.bulk_create(streams, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0010_country"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Stream",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.TextField()),
+                ("codec", models.TextField(null=True)),
+                ("language", models.TextField(null=True)),
+                ("channels", models.IntegerField(null=True)),
+                ("width", models.IntegerField(null=True)),
+                ("height", models.IntegerField(null=True)),
+                ("bitrate", models.IntegerField(null=True)),
+                (
+                    "moviefile",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="streams",
+                        to="movie.moviefile",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "codec"], name="movie_strea_kind_6f11c1_idx"
+                    ),
+                    models.Index(
+                        fields=["kind", "language"], name="movie_strea_kind_950538_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_streams, migrations.RunPython.noop),
+    ]
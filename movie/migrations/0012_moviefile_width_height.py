@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:13
+
+from django.db import migrations, models
+
+
+def fill_width_height(apps, schema_editor):
+    """set width and height of files from screen_size (same as MovieFile.save)"""
+    MovieFile = apps.get_model("movie", "MovieFile")
+    moviefiles = []
+    for moviefile in MovieFile.objects.only("screen_size").iterator():
+        width, _, height = (moviefile.screen_size or "").partition("x")
+        if not (width.isdigit() and height.isdigit()):
+            continue
+        width, height = int(width), int(height)
+        if width < height:
+            width, height = height, width
+        moviefile.width = width
+        moviefile.height = height
+        moviefile.screen_size = f"{width}x{height}"
+        moviefiles.append(moviefile)
+    MovieFile.objects.bulk_update(
+        moviefiles, ["width", "height", "screen_size"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0011_stream"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="moviefile",
+            name="height",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="moviefile",
+            name="width",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name="moviefile",
+            index=models.Index(
+                fields=["width", "height"], name="movie_movie_width_c6fdd6_idx"
+            ),
+        ),
+        migrations.RunPython(fill_width_height, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0012_moviefile_width_height"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="posters_deferred",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:47
+
+from django.db import migrations, models
+
+
+def fill_file_key(apps, schema_editor):
+    """
+    set normalized path of pending files (same as PendingMatch.save)
+        files differing only by case or separator : most recent entry kept
+    """
+    PendingMatch = apps.get_model("movie", "PendingMatch")
+    pendings = {}
+    for pending in PendingMatch.objects.order_by("-date_added", "-id").only("file"):
+        pending.file_key = pending.file.replace("/", "\\").lower()
+        if pending.file_key in pendings:
+            pending.delete()
+        else:
+            pendings[pending.file_key] = pending
+    PendingMatch.objects.bulk_update(pendings.values(), ["file_key"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movie", "0013_movie_posters_deferred"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pendingmatch",
+            name="file_key",
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_file_key, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="pendingmatch",
+            name="file_key",
+            field=models.TextField(editable=False, unique=True),
+        ),
+    ]
@@ -2,8 +2,44 @@
 Database Models
 """
 
+import json
+import ntpath
+
 from django.conf import settings
 from django.db import models
+from django.db.models import Case, Count, Q, Value, When
+
+from moviedb.common import normalize_dbfilename
+
+
+class Genre(models.Model):
+    """Movie genre (TMDB genre, localized name)"""
+
+    # genre name
+    name = models.TextField(unique=True)
+    # id tmdb (None for genres taken from former genres strings)
+    id_tmdb = models.IntegerField(null=True, unique=True)
+
+    def __str__(self):
+        return f"{self.name}"
+
+    class Meta:
+        ordering = ("name",)
+
+
+class Country(models.Model):
+    """Production country"""
+
+    # iso_3166_1 code (e.g. "FR")
+    code = models.TextField(primary_key=True)
+    # country name
+    name = models.TextField()
+
+    def __str__(self):
+        return f"{self.name}"
+
+    class Meta:
+        ordering = ("name",)
 
 
 class Movie(models.Model):
@@ -19,18 +55,24 @@ class Movie(models.Model):
     title_ai = models.TextField(blank=False, null=True)
     # movie genres (e.g. "Comédie, Drame")
     genres = models.TextField(blank=True)
+    # movie genres, for queries by genre
+    genre_list = models.ManyToManyField(Genre, related_name="movies")
     # overwiew
     overview = models.TextField(blank=True)
     # countries in iso_3166_1 (production)
     countries = models.TextField(blank=True)
-    # originale language
-    language = models.TextField(blank=True)
+    # production countries, for queries by country
+    country_list = models.ManyToManyField(Country, related_name="movies")
+    # originale language (iso_639_1 code)
+    language = models.TextField(blank=True, db_index=True)
     # TMDB id
     id_tmdb = models.IntegerField(null=True)
     # append date append
     date_added = models.DateTimeField(blank=False, null=True)
     # various files for this movie
     files = models.ManyToManyField("MovieFile", related_name="+")
+    # posters downloads abandoned during parsing (see "manage.py backfill posters")
+    posters_deferred = models.BooleanField(default=False, db_index=True)
 
     def __str__(self):
         return f"{self.title} - {self.release_year} [{ self.id}]"
@@ -114,6 +156,85 @@ class Poster(models.Model):
         ordering = ("movie",)
 
 
+def file_volume(dbfname):
+    """normalized volume label of database filename ("" if none)"""
+    label, sep, _ = dbfname.partition(":")
+    return label.lower() if sep else ""
+
+
+def file_directory(dbfname):
+    """normalized parent directory of database filename"""
+    return ntpath.dirname(normalize_dbfilename(dbfname))
+
+
+# resolution classes : (name, min width, max width excluded)
+RESOLUTIONS = [
+    ("SD", 0, 1200),
+    ("720p", 1200, 1400),
+    ("1080p", 1400, 3000),
+    ("2160p", 3000, None),
+]
+
+
+def image_size(screen_size):
+    """(width, height) of screen size string "WxH", landscape, None if unknown"""
+    width, _, height = (screen_size or "").partition("x")
+    if not (width.isdigit() and height.isdigit()):
+        return None, None
+    width, height = int(width), int(height)
+    return (height, width) if width < height else (width, height)
+
+
+class MovieFileQuerySet(models.QuerySet):
+    """MovieFile queries on volume and directory (indexed columns)"""
+
+    def with_file(self, dbfname):
+        """files with database filename (case and separator insensitive)"""
+        return self.filter(file_key=normalize_dbfilename(dbfname))
+
+    def with_resolution(self, name):
+        """files of resolution class (range on width index)"""
+        for resolution, min_width, max_width in RESOLUTIONS:
+            if resolution == name:
+                qvar = Q(width__gte=min_width)
+                if max_width:
+                    qvar &= Q(width__lt=max_width)
+                return self.filter(qvar)
+        return self.none()
+
+    def resolution_counts(self):
+        """[(resolution class, number of files)] in one aggregate query"""
+        whens = [
+            When(width__lt=max_width, then=Value(name))
+            for name, _, max_width in RESOLUTIONS
+            if max_width
+        ]
+        return (
+            self.filter(width__isnull=False)
+            .annotate(
+                resolution=Case(*whens, default=Value(RESOLUTIONS[-1][0]))
+            )
+            .values_list("resolution")
+            .annotate(num_files=Count("id"))
+            .order_by("resolution")
+        )
+
+    def on_volume(self, volume):
+        """files on volume label (all files if volume empty or all volumes)"""
+        if not volume or volume == settings.ALL_VOLUMES:
+            return self
+        return self.filter(volume=volume.lower())
+
+    def in_directory(self, directory, recurs=False):
+        """files in database directory, and in its sub-directories if recurs"""
+        directory = normalize_dbfilename(directory).rstrip("\\")
+        qvar = Q(directory=directory)
+        if recurs:
+            # range on index : sub-directories start with "directory\", "]" follows "\"
+            qvar |= Q(directory__gte=directory + "\\", directory__lt=directory + "]")
+        return self.filter(qvar)
+
+
 class MovieFile(models.Model):
     """
     MovieFile : movie file
@@ -122,6 +243,8 @@ class MovieFile(models.Model):
 
     # full path of movie file
     file = models.TextField(unique=True, blank=False, null=False)
+    # normalized full path, for case insensitive lookups (set on save)
+    file_key = models.TextField(unique=True, editable=False)
     # file size
     file_size = models.IntegerField(null=True)
     # movie format (container, streams)
@@ -130,8 +253,16 @@ class MovieFile(models.Model):
     bitrate = models.IntegerField(null=True)
     # image size
     screen_size = models.TextField(null=True)
+    # image size, landscape (set on save from screen_size)
+    width = models.IntegerField(null=True)
+    height = models.IntegerField(null=True)
     # duration (seconds)
     duration = models.IntegerField(default=0)
+    # content fingerprint (size and hash of first and last MB, see file_fingerprint)
+    fingerprint = models.TextField(null=True, db_index=True)
+    # normalized volume label and parent directory of file (set on save)
+    volume = models.TextField(null=True, db_index=True)
+    directory = models.TextField(null=True, db_index=True)
 
     # status (present / moved / deleted ...)
     file_status = models.TextField(blank=False, null=False)
@@ -141,11 +272,24 @@ class MovieFile(models.Model):
     # the movie description
     movie = models.ForeignKey(Movie, on_delete=models.SET_NULL, null=True)
 
+    objects = MovieFileQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.file} - {self.movie.title}"
 
+    def save(self, *args, **kwargs):
+        self.width, self.height = image_size(self.screen_size)
+        if self.width:
+            # some files have incorrect screen_size (portrait)
+            self.screen_size = f"{self.width}x{self.height}"
+        self.file_key = normalize_dbfilename(self.file)
+        self.volume = file_volume(self.file)
+        self.directory = file_directory(self.file)
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ("file",)
+        indexes = [models.Index(fields=["width", "height"])]
 
     # helper functions
     def duration_string(self):
@@ -153,6 +297,37 @@ class MovieFile(models.Model):
         return f"{(self.duration // 3600):02d}:{((self.duration // 60) % 60):02d}:{(self.duration % 60):02d}"
 
 
+class Stream(models.Model):
+    """Stream of movie file (video, audio, subtitle), taken from ffprobe"""
+
+    # movie file
+    moviefile = models.ForeignKey(
+        MovieFile, on_delete=models.CASCADE, related_name="streams"
+    )
+    # "video", "audio" or "subtitle"
+    kind = models.TextField()
+    # codec name (e.g. "hevc", "aac", "subrip")
+    codec = models.TextField(null=True)
+    # language iso 639-2 (e.g. "fre"), None if undefined
+    language = models.TextField(null=True)
+    # audio channels
+    channels = models.IntegerField(null=True)
+    # video image size
+    width = models.IntegerField(null=True)
+    height = models.IntegerField(null=True)
+    # stream bitrate
+    bitrate = models.IntegerField(null=True)
+
+    def __str__(self):
+        return f"{self.kind}: {self.codec} ({self.language})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "codec"]),
+            models.Index(fields=["kind", "language"]),
+        ]
+
+
 class UserMovie(models.Model):
     """
     UserMovie : user datas on movie
@@ -172,3 +347,65 @@ class UserMovie(models.Model):
 
     class Meta:
         unique_together = ("user", "movie")
+
+
+class ScannedDirectory(models.Model):
+    """
+    ScannedDirectory : directory state at last successful scan (incremental parsing)
+    """
+
+    # directory (normalized database filename)
+    directory = models.TextField(unique=True)
+    # directory modification time
+    mtime = models.FloatField()
+    # sub-directories names (json list)
+    subdirs = models.TextField(default="[]")
+    # date of scan
+    date_scanned = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.directory} : {self.date_scanned}"
+
+
+class PendingMatch(models.Model):
+    """
+    PendingMatch : movie file with several TMDB candidates, waiting for a choice
+    """
+
+    # file (database filename)
+    file = models.TextField(unique=True)
+    # normalized full path, for case insensitive lookups (set on save)
+    file_key = models.TextField(unique=True, editable=False)
+    # ffprobe json output of file
+    probe = models.TextField()
+    # TMDB candidates, json list of :
+    #   [id_tmdb, title, original_title, release_date, overview, original_language]
+    candidates = models.TextField()
+    # date added in queue
+    date_added = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.file} : {len(json.loads(self.candidates))} candidates"
+
+    def save(self, *args, **kwargs):
+        self.file_key = normalize_dbfilename(self.file)
+        super().save(*args, **kwargs)
+
+
+class MatchMemo(models.Model):
+    """
+    MatchMemo : TMDB movie resolved for a title (and year) parsed from filenames
+    """
+
+    # normalized title (see moviedesc.normalize_title)
+    title_key = models.TextField()
+    # year parsed from filename (0 if none)
+    year = models.IntegerField(default=0)
+    # TMDB id
+    id_tmdb = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.title_key} ({self.year}) : {self.id_tmdb}"
+
+    class Meta:
+        unique_together = ("title_key", "year")
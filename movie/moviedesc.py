@@ -3,11 +3,54 @@
     Compact movie description from TMDB
 """
 
+import re
+from difflib import SequenceMatcher
+
+import pycountry
+import unidecode
 from tmdbv3api import Movie as TMDbMovie, Search as TMDbSearch
+from tmdbv3api.exceptions import TMDbException
+
+from django.conf import settings
 
 from movie.models import Movie
 
 
+def details_append(tmdb_movie: TMDbMovie, original_language=""):
+    """
+    append_to_response for TMDB movie details : credits and images in same request
+        images in TMDb language, original language, english or without language
+    """
+    languages = [
+        tmdb_movie.language.split("-")[0],
+        original_language.lower(),
+        "en",
+        "null",
+    ]
+    languages = ",".join(dict.fromkeys([lang for lang in languages if lang]))
+    return f"credits,images&include_image_language={languages}"
+
+
+def normalize_title(title):
+    """title without accents, punctuation and case, for comparisons"""
+    return " ".join(re.findall(r"[a-z0-9]+", unidecode.unidecode(title).lower()))
+
+
+def audio_languages(container):
+    """languages (ISO 639-1, upper case) of audio streams in ffprobe result"""
+    languages = set()
+    for stream in container.get("streams", []):
+        if stream.get("codec_type") != "audio":
+            continue
+        code = (stream.get("tags") or {}).get("language", "").lower()
+        language = pycountry.languages.get(alpha_3=code) or pycountry.languages.get(
+            bibliographic=code
+        )
+        if language and hasattr(language, "alpha_2"):
+            languages.add(language.alpha_2.upper())
+    return languages
+
+
 class MovieDescription:
     """
     Movie description from TMDb
@@ -21,8 +64,10 @@ class MovieDescription:
         "release_date",
         "overview",
         "genres",
+        "genre_list",
         "original_language",
         "countries",
+        "details",
     ]
 
     def __init__(self, movie: Movie):
@@ -37,8 +82,10 @@ class MovieDescription:
         self.overview = movie.overview
         if "genres" in movie:
             self.genres = ", ".join([genre.name for genre in movie.genres])
+            self.genre_list = [(genre.id, genre.name) for genre in movie.genres]
         else:
             self.genres = None
+            self.genre_list = None
             self.fulldesc = False
         self.original_language = movie.original_language.upper()
         self.countries = (
@@ -46,6 +93,8 @@ class MovieDescription:
             if self.fulldesc
             else None
         )
+        # full TMDB details, with credits and images
+        self.details = movie if "credits" in movie else None
 
     @classmethod
     def from_search(cls, tmdb_search: TMDbSearch, moviename: str, year=None):
@@ -56,15 +105,93 @@ class MovieDescription:
     @classmethod
     def from_id(cls, tmdb_movie: TMDbMovie, idmovie: int):
         """get TMDB movie by id"""
-        return cls(tmdb_movie.details(str(idmovie)))
+        return cls(
+            tmdb_movie.details(
+                str(idmovie), append_to_response=details_append(tmdb_movie)
+            )
+        )
 
     def get_full_description(self, tmdb_movie: TMDbMovie):
-        """complete description with details"""
-        if self.fulldesc:
+        """complete description with details, credits and images"""
+        if self.fulldesc and self.details:
             return
-        movie = tmdb_movie.details(self.id_tmdb)
+        movie = tmdb_movie.details(
+            self.id_tmdb,
+            append_to_response=details_append(tmdb_movie, self.original_language),
+        )
         self.genres = ", ".join([genre.name for genre in movie.genres])
+        self.genre_list = [(genre.id, genre.name) for genre in movie.genres]
         self.countries = ", ".join(
             [country["iso_3166_1"] for country in movie.production_countries]
         )
+        self.details = movie
         self.fulldesc = True
+
+    def score(self, moviename, year=None, duration=0, languages=None):
+        """
+        likelihood (0 to 1) that movie file is this movie
+            moviename, year : parsed from filename
+            duration : movie file duration (seconds)
+            languages : audio streams languages
+        runtime is compared only if details are known
+        """
+        moviename = normalize_title(moviename)
+        score = 0.4 * max(
+            SequenceMatcher(None, moviename, normalize_title(title)).ratio()
+            for title in [self.title, self.original_title]
+        )
+        if not year or not self.release_date:
+            score += 0.1
+        elif int(year) == int(self.release_date):
+            score += 0.25
+        elif abs(int(year) - int(self.release_date)) == 1:
+            score += 0.15
+        runtime = self.details.get("runtime") if self.details else None
+        if not runtime or not duration:
+            score += 0.08
+        elif abs(duration / 60 - runtime) <= 5:
+            score += 0.2
+        elif abs(duration / 60 - runtime) <= 15:
+            score += 0.1
+        if not languages:
+            score += 0.05
+        elif self.original_language in languages:
+            score += 0.15
+        return score
+
+
+def best_candidate(
+    tmdb_movie: TMDbMovie, movies, moviename, year, container, skipped=None
+):
+    """
+    choose automatically among TMDB candidates for a movie file
+        return (MovieDescription or None if not confident enough, score)
+        best candidates are completed with details (runtime), candidates whose
+        details are unavailable are skipped, (candidate, error) appended to skipped
+    """
+    duration = float(container["format"].get("duration") or 0)
+    languages = audio_languages(container)
+    movies = sorted(
+        movies, key=lambda movie: -movie.score(moviename, year, duration, languages)
+    )
+    for movie in movies[: settings.AUTO_MATCH_DETAILS]:
+        try:
+            movie.get_full_description(tmdb_movie)
+        except TMDbException as _e:
+            if skipped is not None:
+                skipped.append((movie, _e))
+            movies.remove(movie)
+    scores = sorted(
+        ((movie.score(moviename, year, duration, languages), movie) for movie in movies),
+        key=lambda scored: -scored[0],
+    )
+    if not scores:
+        return None, 0
+    best_score, best = scores[0]
+    next_score = scores[1][0] if len(scores) > 1 else 0
+    if (
+        best_score >= settings.AUTO_MATCH_CONFIDENCE
+        and best_score - next_score >= settings.AUTO_MATCH_MARGIN
+    ):
+        return best, best_score
+    return None, best_score
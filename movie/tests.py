@@ -1,3 +1,514 @@
-from django.test import TestCase
+"""
+tests of asyncio TMDb client against a local stub HTTP server, automatic matching,
+batch and paging API, files queries and data migrations
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from tmdbv3api import Movie as TMDbMovie, Search as TMDbSearch
+from tmdbv3api.as_obj import AsObj
+from tmdbv3api.exceptions import TMDbException
+
+from movie import api
+from movie.management.commands.movieparsing import Command
+from movie.models import MatchMemo, Movie, MovieFile
+from movie.moviedesc import MovieDescription, best_candidate
+from moviedb.cache import ResponseCache
+from moviedb.tmdb import TMDB_Api
+
+
+class StubTMDbHandler(BaseHTTPRequestHandler):
+    """answer TMDb requests with path and query, after server delay"""
+
+    def do_GET(self):
+        """json response"""
+        with self.server.lock:
+            self.server.paths.append(self.path)
+        time.sleep(self.server.delay)
+        if self.path.startswith("/movie/0"):
+            body = {"success": False, "status_message": "not found"}
+        elif self.path.startswith("/search/"):
+            body = {"path": self.path.split("?")[0], "page": 1, "results": []}
+        else:
+            body = {"path": self.path.split("?")[0]}
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        """no log"""
+
+
+class AsyncTMDbClientTest(SimpleTestCase):
+    """AsyncTMDbClient through TMDB_Api.start_async"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubTMDbHandler)
+        self.server.lock = threading.Lock()
+        self.server.paths = []
+        self.server.delay = 0.1
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.api = self.create_api()
+
+    def tearDown(self):
+        self.api.stop_async()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def create_api(self, cache=None, rate=40):
+        """TMDB_Api without configuration request, async client started"""
+        with mock.patch("tmdbv3api.Configuration.info", return_value={}):
+            api = TMDB_Api("key", "fr-FR", cache=cache)
+        api.start_async(rate=rate, base_url=self.base_url)
+        return api
+
+    def test_details(self):
+        """request url and response"""
+        response = self.api.submit(self.api.aio.movie_details(603, "credits")).result()
+        self.assertEqual(response, {"path": "/movie/603"})
+        self.assertIn("append_to_response=credits", self.server.paths[0])
+        self.assertIn("language=fr-FR", self.server.paths[0])
+
+    def test_error(self):
+        """TMDb error : exception returned by gather"""
+        results = self.api.gather([self.api.aio.movie_details(0, "")])
+        self.assertEqual(str(results[0]), "not found")
+
+    def test_inflight(self):
+        """identical requests in flight made once, others concurrently"""
+        start = time.monotonic()
+        results = self.api.gather(
+            [self.api.aio.movie_details(603, "") for _ in range(5)]
+            + [self.api.aio.movie_details(id_tmdb, "") for id_tmdb in range(1, 11)]
+        )
+        self.assertEqual(len(self.server.paths), 11)
+        self.assertEqual(results[:5], [{"path": "/movie/603"}] * 5)
+        # 11 requests of 0.1s in flight together
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_rate(self):
+        """requests rate limited by token bucket"""
+        self.api.stop_async()
+        self.server.delay = 0
+        self.api = self.create_api(rate=10)
+        start = time.monotonic()
+        self.api.gather(
+            [self.api.aio.movie_details(id_tmdb, "") for id_tmdb in range(1, 21)]
+        )
+        # 10 tokens in reserve, 10 more at 10 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+        self.assertEqual(len(self.server.paths), 20)
+
+    def test_cache(self):
+        """responses cache : second request answered by cache"""
+        self.api.stop_async()
+        cache = ResponseCache(
+            os.path.join(self.tmpdir.name, "cache.db"), {"default": 60}, 1 << 20
+        )
+        self.api = self.create_api(cache=cache)
+        for _ in range(2):
+            response = self.api.submit(
+                self.api.aio.search_movies("Matrix", 1999)
+            ).result()
+        self.assertEqual(response["path"], "/search/movie")
+        self.assertEqual(len(self.server.paths), 1)
+        self.assertEqual(cache.hits, 1)
+        cache.close()
+
+    def test_cache_shared(self):
+        """responses of asyncio client answer synchronous requests (same cache keys)"""
+        self.api.stop_async()
+        cache = ResponseCache(
+            os.path.join(self.tmpdir.name, "cache.db"), {"default": 60}, 1 << 20
+        )
+        # synchronous requests must not reach TMDb
+        with mock.patch.object(
+            TMDbSearch, "_call", side_effect=AssertionError("not cached")
+        ), mock.patch.object(
+            TMDbMovie, "_call", side_effect=AssertionError("not cached")
+        ):
+            self.api = self.create_api(cache=cache)
+            for year in (1999, None):
+                self.api.submit(self.api.aio.search_movies("Matrix", year)).result()
+                self.api.search.movies({"query": "Matrix", "year": year})
+            self.api.submit(self.api.aio.movie_details(603, "credits,images")).result()
+            self.api.movie.details(603, append_to_response="credits,images")
+        self.assertEqual(len(self.server.paths), 3)
+        self.assertEqual(cache.hits, 3)
+        cache.close()
+
+    def test_stop(self):
+        """pending requests cancelled, loop thread ended and loop closed"""
+        self.server.delay = 1
+        loop, thread = self.api.loop, self.api.thread
+        future = self.api.submit(self.api.aio.movie_details(603, ""))
+        time.sleep(0.1)
+        self.api.stop_async()
+        self.assertTrue(future.cancelled())
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(loop.is_closed())
+        self.assertIsNone(self.api.loop)
+
+
+def candidate(id_tmdb, title, year, language="EN", runtime=None):
+    """TMDB candidate as search result, with details if runtime"""
+    movie = {
+        "id": id_tmdb,
+        "title": title,
+        "original_title": title,
+        "release_date": f"{year}-01-01",
+        "overview": "",
+        "original_language": language.lower(),
+    }
+    if runtime:
+        movie.update(genres=[], production_countries=[], credits={}, runtime=runtime)
+    return MovieDescription(AsObj(**movie))
+
+
+def container(duration, language="eng"):
+    """ffprobe result of movie file"""
+    return {
+        "format": {"duration": str(duration)},
+        "streams": [{"codec_type": "audio", "tags": {"language": language}}],
+    }
+
+
+class BestCandidateTest(SimpleTestCase):
+    """scores of TMDB candidates and automatic choice"""
+
+    def setUp(self):
+        self.runtimes = {603: 136, 604: 138, 605: 129}
+        self.tmdb_movie = mock.Mock(language="fr-FR")
+        self.tmdb_movie.details.side_effect = self.details
+
+    def details(self, id_tmdb, append_to_response):
+        """TMDb details of movies with known runtime, else TMDb error"""
+        if id_tmdb not in self.runtimes:
+            raise TMDbException("not found")
+        return candidate(id_tmdb, "", 0, runtime=self.runtimes[id_tmdb]).details
+
+    def test_score(self):
+        """title, year, runtime and language compared"""
+        matrix = candidate(603, "The Matrix", 1999, runtime=136)
+        self.assertAlmostEqual(matrix.score("the matrix", 1999, 136 * 60, {"EN"}), 1.0)
+        self.assertAlmostEqual(matrix.score("the matrix", 2000, 100 * 60, {"FR"}), 0.55)
+        # runtime unknown, no year, no audio language : neutral parts
+        self.assertAlmostEqual(
+            candidate(603, "The Matrix", 1999).score("the matrix"), 0.63
+        )
+
+    def test_best(self):
+        """best candidate chosen, completed with details"""
+        movies = [
+            candidate(604, "The Matrix Reloaded", 2003),
+            candidate(603, "The Matrix", 1999),
+        ]
+        movie, score = best_candidate(
+            self.tmdb_movie, movies, "The Matrix", 1999, container(136 * 60)
+        )
+        self.assertEqual(movie.id_tmdb, 603)
+        self.assertAlmostEqual(score, 1.0)
+        self.assertTrue(movie.fulldesc)
+
+    def test_ambiguous(self):
+        """no choice if best score doesn't exceed next one by margin"""
+        movies = [candidate(603, "Solaris", 1999), candidate(605, "Solaris", 1999)]
+        movie, score = best_candidate(
+            self.tmdb_movie, movies, "Solaris", 1999, container(0)
+        )
+        self.assertIsNone(movie)
+        self.assertGreater(score, settings.AUTO_MATCH_CONFIDENCE)
+
+    def test_skipped(self):
+        """candidate without details skipped and reported"""
+        del self.runtimes[603]
+        movies = [candidate(603, "Solaris", 1999), candidate(605, "Solaris", 1999)]
+        skipped = []
+        movie, _ = best_candidate(
+            self.tmdb_movie, movies, "Solaris", 1999, container(129 * 60), skipped
+        )
+        self.assertEqual(movie.id_tmdb, 605)
+        self.assertEqual(
+            [(movie.id_tmdb, str(error)) for movie, error in skipped],
+            [(603, "not found")],
+        )
+
+
+class MatchMemoTest(TestCase):
+    """TMDB ids memorized for titles and years parsed from filenames"""
+
+    def setUp(self):
+        self.command = Command()
+        self.command.options = {"simu": False}
+        self.command.tmdb = mock.Mock()
+        self.command.tmdb.movie = mock.Mock(language="fr-FR")
+
+    def test_memorize(self):
+        """memo found by normalized title and year"""
+        self.command.memorize_match("Amélie, Poulain", 2001, 194)
+        self.command.memorize_match("Amelie Poulain", "2001", 195)
+        self.assertEqual(MatchMemo.objects.count(), 1)
+        self.assertEqual(self.command.memo_match("AMELIE  POULAIN", "2001"), 195)
+        self.assertIsNone(self.command.memo_match("Amelie Poulain", None))
+
+    def test_simu(self):
+        """nothing memorized in simulation, nor without title"""
+        self.command.memorize_match("!!!", 2001, 194)
+        self.command.options["simu"] = True
+        self.command.memorize_match("Amelie Poulain", 2001, 194)
+        self.assertFalse(MatchMemo.objects.exists())
+
+    def test_removed(self):
+        """memo of id unknown by TMDB deleted, title searched again"""
+        self.command.memorize_match("Amelie Poulain", 2001, 194)
+        self.command.tmdb.movie.details.side_effect = TMDbException("not found")
+        self.assertIsNone(self.command.memo_movies(194, "Amelie Poulain", 2001))
+        self.assertFalse(MatchMemo.objects.exists())
+
+    def test_found(self):
+        """memorized id described as search result"""
+        self.command.tmdb.movie.details.return_value = candidate(
+            194, "Amelie", 2001, runtime=122
+        ).details
+        movies = self.command.memo_movies(194, "Amelie Poulain", 2001)
+        self.assertEqual([movie.id_tmdb for movie in movies], [194])
+
+
+def add_moviefiles(*files):
+    """MovieFile entries of database filenames, ordered by id"""
+    movie = Movie.objects.create(title="Movie", original_title="Movie")
+    return [
+        MovieFile.objects.create(file=file, file_status="OK", movie=movie)
+        for file in files
+    ]
+
+
+class MovieFileQueryTest(TestCase):
+    """MovieFile queries on indexed volume and directory"""
+
+    def setUp(self):
+        add_moviefiles(
+            "Films:\\A\\m1.mkv",
+            "Films:/A/B/m2.mkv",
+            "films:\\AB\\m3.mkv",
+            "Other:\\A\\m4.mkv",
+            "C:\\m5.mkv",
+        )
+
+    def files(self, moviefiles):
+        """basenames of files"""
+        return sorted(moviefile.file[-6:-4] for moviefile in moviefiles)
+
+    def test_in_directory(self):
+        """files of directory (case and separator insensitive), sub-directories"""
+        self.assertEqual(
+            self.files(MovieFile.objects.in_directory("FILMS:/a/")), ["m1"]
+        )
+        self.assertEqual(
+            self.files(MovieFile.objects.in_directory("Films:\\A", recurs=True)),
+            ["m1", "m2"],
+        )
+
+    def test_on_volume(self):
+        """files of volume label, all files for all volumes"""
+        self.assertEqual(
+            self.files(MovieFile.objects.on_volume("FILMS")), ["m1", "m2", "m3"]
+        )
+        self.assertEqual(self.files(MovieFile.objects.on_volume("c")), ["m5"])
+        self.assertEqual(len(MovieFile.objects.on_volume(settings.ALL_VOLUMES)), 5)
+        self.assertEqual(len(MovieFile.objects.on_volume("")), 5)
+
+
+class MoviesApiTest(TestCase):
+    """batch operations and keyset paging of movie files"""
+
+    def setUp(self):
+        user = User.objects.create_user("admin", is_staff=True)
+        self.client.force_login(user)
+        self.moviefiles = add_moviefiles(*[f"Films:\\m{num}.mkv" for num in range(5)])
+
+    def post(self, name, datas):
+        """POST json to api, response"""
+        return self.client.post(reverse(name), {"json": json.dumps(datas)})
+
+    def test_batch(self):
+        """results in operations order, failing operation rolled back alone"""
+        first, second = self.moviefiles[:2]
+        append = mock.Mock(return_value={"code": 0, "result": "appended"})
+        operations = [
+            {"op": "update", "id": first.id, "file_status": "MOVED"},
+            {"op": "update", "id": first.id, "file": second.file},
+            {"op": "append", "file": "Films:\\new.mkv"},
+            {"op": "info", "file": "films:/M1.MKV"},
+            {"op": "remove", "id": -1},
+            {"op": "unknown"},
+        ]
+        with mock.patch.dict(api.BATCH_OPERATIONS, {"append": append}):
+            response = self.post("movies_batch", {"operations": operations}).json()
+        codes = [result["code"] for result in response["results"]]
+        self.assertEqual(codes, [0, 1, 0, 0, 1, -2])
+        self.assertEqual(response["results"][2]["result"], "appended")
+        self.assertEqual(response["results"][3]["id"], second.id)
+        append.assert_called_once_with(operations[2])
+        first.refresh_from_db()
+        self.assertEqual((first.file, first.file_status), ("Films:\\m0.mkv", "MOVED"))
+
+    def test_batch_invalid(self):
+        """operations must be a list"""
+        response = self.post("movies_batch", {"operations": {}}).json()
+        self.assertEqual(response["code"], -2)
+
+    def test_paging(self):
+        """pages of ids after last id of previous page"""
+        ids = [moviefile.id for moviefile in self.moviefiles]
+        pages, after = [], None
+        while True:
+            response = self.post(
+                "movies_ids", {"column": "idfile", "count": 2, "after": after}
+            ).json()
+            if not response["num_datas"]:
+                break
+            pages.append(response["datas"])
+            after = response["last"]
+        self.assertEqual(pages, [ids[:2], ids[2:4], ids[4:]])
+        self.assertIsNone(response["last"])
+        response = self.post(
+            "movies_ids", {"column": "file", "count": -1, "after": ids[3]}
+        ).json()
+        self.assertEqual(response["datas"], ["Films:\\m4.mkv"])
+
+    def test_stream(self):
+        """NDJSON response, one row per line"""
+        response = self.post(
+            "movies_ids",
+            {
+                "column": "file",
+                "count": 2,
+                "after": self.moviefiles[0].id,
+                "stream": True,
+            },
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            rows,
+            [
+                {"id": moviefile.id, "file": moviefile.file}
+                for moviefile in self.moviefiles[1:3]
+            ],
+        )
+
+
+class MigrationTest(TransactionTestCase):
+    """data migrations, run on datas of previous schema"""
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        self.apps = self.migrate(self.migrate_from)
+
+    def tearDown(self):
+        self.migrate(None)
+
+    @staticmethod
+    def migrate(name):
+        """migrate movie app to migration (latest if None), return models"""
+        executor = MigrationExecutor(connection)
+        if name:
+            target = [("movie", name)]
+        else:
+            target = executor.loader.graph.leaf_nodes("movie")
+        executor.migrate(target)
+        executor.loader.build_graph()
+        return executor.loader.project_state(target).apps
+
+
+class SeedMemoMigrationTest(MigrationTest):
+    """0005 : match memo seeded with movies titles and years"""
+
+    migrate_from = "0004_pendingmatch"
+    migrate_to = "0005_matchmemo"
+
+    def test_seed(self):
+        """keys with year only, ambiguous keys ignored"""
+        Movie = self.apps.get_model("movie", "Movie")
+        for title, year, id_tmdb in [
+            ("Le Fabuleux Destin d'Amélie Poulain", 2001, 194),
+            ("Solaris", 1972, 593),
+            ("Solaris", 2002, 2103),
+            ("Twin", 1990, 1),
+            ("Twin", 1990, 2),
+            ("Unknown", 1990, None),
+        ]:
+            Movie.objects.create(
+                title=title,
+                title_ai=title,
+                original_title=title,
+                release_year=year,
+                id_tmdb=id_tmdb,
+            )
+        apps = self.migrate(self.migrate_to)
+        memo = apps.get_model("movie", "MatchMemo").objects.values_list(
+            "title_key", "year", "id_tmdb"
+        )
+        self.assertEqual(
+            sorted(memo),
+            [
+                ("le fabuleux destin d amelie poulain", 2001, 194),
+                ("solaris", 1972, 593),
+                ("solaris", 2002, 2103),
+            ],
+        )
+
+
+class FileKeyMigrationTest(MigrationTest):
+    """0008 : normalized paths of movie files"""
+
+    migrate_from = "0007_moviefile_volume_directory"
+    migrate_to = "0008_moviefile_file_key"
+
+    def add_files(self, *files):
+        """MovieFile entries of previous schema"""
+        MovieFile = self.apps.get_model("movie", "MovieFile")
+        for file in files:
+            MovieFile.objects.create(file=file, file_status="OK")
+
+    def test_file_key(self):
+        """file_key set from path"""
+        self.add_files("Films:/A/M1.mkv", "Films:\\A\\m2.mkv")
+        apps = self.migrate(self.migrate_to)
+        keys = apps.get_model("movie", "MovieFile").objects.values_list(
+            "file_key", flat=True
+        )
+        self.assertEqual(sorted(keys), ["films:\\a\\m1.mkv", "films:\\a\\m2.mkv"])
+
+    def test_collision(self):
+        """files differing only by case or separator : migration fails"""
+        self.add_files("Films:/A/M1.mkv", "films:\\a\\m1.MKV")
+        with self.assertRaisesMessage(RuntimeError, "Films:/A/M1.mkv | films:"):
+            self.migrate(self.migrate_to)
+        self.apps.get_model("movie", "MovieFile").objects.filter(
+            file="Films:/A/M1.mkv"
+        ).delete()
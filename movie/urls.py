@@ -88,6 +88,7 @@ urlpatterns = [
     re_path(r"^api/movies/indexes$", api.movies_ids, name="movies_ids"),
     re_path(r"^api/movie/update$", api.update_movie, name="update_movie"),
     re_path(r"^api/movie/remove$", api.remove_movie, name="remove_movie"),
+    re_path(r"^api/movies/batch$", api.movies_batch, name="movies_batch"),
     re_path(r"^api/dlna/discover$", api.dlna_discover, name="dlna_discover"),
     re_path(r"^api/dlna/checkmedias$", api.dlna_check_medias, name="dlna_check_medias"),
     # tests
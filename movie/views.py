@@ -11,7 +11,6 @@ import ntpath
 import os
 import platform
 from datetime import datetime, timedelta
-from collections import Counter
 from urllib.parse import urlparse
 import unidecode
 import pycountry
@@ -30,7 +29,7 @@ from django.urls import reverse
 from django.utils.timezone import make_aware
 from django_sendfile import sendfile
 
-from .models import Movie, MovieFile, Poster, Team, UserMovie
+from .models import Country, Movie, MovieFile, Poster, Stream, Team, UserMovie
 
 ALL_JOBS = "<All Jobs>"
 
@@ -114,26 +113,21 @@ def home(request):
     """main page"""
     counts = []
     for vol_label, vol_alias, _, _ in settings.VOLUMES:
-        qvar = Q(file_status="OK")
+        moviefiles = MovieFile.objects.on_volume(vol_label).filter(file_status="OK")
         if vol_label == settings.ALL_VOLUMES:
             vol_label = ""
-        else:
-            qvar &= Q(file__istartswith=vol_label)
-        nbmovies = MovieFile.objects.filter(qvar).count()
+        nbmovies = moviefiles.count()
         if not nbmovies:
             continue
-        size = MovieFile.objects.filter(qvar).aggregate(Sum("file_size"))
+        size = moviefiles.aggregate(Sum("file_size"))
         counts.append((vol_label, vol_alias, (nbmovies, size["file_size__sum"])))
 
-    # extract all languages from DB
-    languages = set()
-    langs = [
-        l
-        for l in Movie.objects.all()
-        .order_by("language")
+    # extract all languages from DB (language index)
+    langs = (
+        Movie.objects.order_by("language")
         .values_list("language", flat=True)
         .distinct()
-    ]
+    )
     languages = []
     for lang in langs:
         try:
@@ -142,22 +136,13 @@ def home(request):
             pass
     languages.sort(key=lambda i: i[1])
 
-    # extract all countries from DB
-    countries_set = set()
-    for country in (
-        Movie.objects.all().order_by().values_list("countries", flat=True).distinct()
-    ):
-        myset = set(country.split(", "))
-        countries_set = countries_set.union(myset)
-    countries = []
-    for country in countries_set:
-        try:
-            countries.append(
-                (country, pycountry.countries.get(alpha_2=country.strip()).name)
-            )
-        except AttributeError:
-            pass
-    countries.sort(key=lambda i: i[1])
+    # production countries of movies : (code, name)
+    countries = (
+        Country.objects.filter(movies__isnull=False)
+        .values_list("code", "name")
+        .distinct()
+        .order_by("name")
+    )
 
     jobs = (
         Team.objects.all()
@@ -268,9 +253,7 @@ def no_viewed(request, volume, order):
     """movies not viewed"""
     order = set_order(order)
     request.session["order"] = order[0]
-    movies = MovieFile.objects.filter(
-        file_status="OK", file__istartswith=volume
-    ).exclude(
+    movies = MovieFile.objects.on_volume(volume).filter(file_status="OK").exclude(
         movie__id__in=UserMovie.objects.filter(
             user__username=request.user.get_username(),
             viewed__gt=0,
@@ -293,26 +276,20 @@ def no_viewed_genres(request, volume, order):
     order = set_order(order)
     request.session["volume"] = volume
     request.session["order"] = order[0]
-    genres = {}
-    qsgenres = (
-        MovieFile.objects.filter(file_status="OK", file__istartswith=volume)
+    # (genre, number of movies)
+    genres = (
+        MovieFile.objects.on_volume(volume)
+        .filter(file_status="OK", movie__genre_list__isnull=False)
         .exclude(
             movie__id__in=UserMovie.objects.filter(
                 user__username=request.user.get_username(),
                 viewed__gt=0,
             ).values("movie")
         )
-        .values("movie__genres")
-        .distinct()
+        .values_list("movie__genre_list__name")
+        .annotate(num_movies=Count("movie", distinct=True))
+        .order_by("movie__genre_list__name")
     )
-    for dgenres in qsgenres:
-        movie_genres = dgenres["movie__genres"].split(", ")
-        for genre in movie_genres:
-            if not genre:
-                continue
-            genres[genre] = 1 if not genre in genres else genres[genre] + 1
-    # convert genres dict in list
-    genres = [(genre, genres[genre]) for genre in sorted(genres.keys())]
     context = {
         "table_type": "Movies not viewed by genre",
         "genres": genres,
@@ -329,8 +306,8 @@ def ajax_no_viewed_genre(request):
     order = request.session["order"]
     # movies for genre wanted
     movies = (
-        MovieFile.objects.filter(
-            file_status="OK", file__istartswith=volume, movie__genres__contains=genre
+        MovieFile.objects.on_volume(volume).filter(
+            file_status="OK", movie__genre_list__name=genre
         )
         .exclude(
             movie__id__in=UserMovie.objects.filter(
@@ -360,9 +337,8 @@ def movies_viewed(request, volume, order):
     """movies already viewed"""
     order = set_order(order)
     request.session["order"] = order[0]
-    movies = MovieFile.objects.filter(
+    movies = MovieFile.objects.on_volume(volume).filter(
         file_status="OK",
-        file__istartswith=volume,
         movie__id__in=UserMovie.objects.filter(
             user__username=request.user.get_username(),
             viewed__gt=0,
@@ -384,20 +360,13 @@ def movies_count_genres(request, order):
     """number of movies by genre"""
     order = set_order(order)
     request.session["order"] = order[0]
-    # build duplicated titles
-    genres_movies = MovieFile.objects.values("movie__genres")
-    num_genres = {}
-    for entry in genres_movies:
-        for genre in entry["movie__genres"].split(","):
-            genre = genre.strip()
-            if not genre:
-                continue
-            if genre in num_genres:
-                num_genres[genre] += 1
-            else:
-                num_genres[genre] = 1
-    # convert to list (genre, count)
-    num_genres = [(genre, num_genres[genre]) for genre in sorted(num_genres.keys())]
+    # (genre, number of movie files)
+    num_genres = (
+        MovieFile.objects.filter(movie__genre_list__isnull=False)
+        .values_list("movie__genre_list__name")
+        .annotate(num_files=Count("id"))
+        .order_by("movie__genre_list__name")
+    )
     context = {
         "genres": num_genres,
     }
@@ -408,7 +377,7 @@ def movies_genre(request, genre, order):
     """movies for a genre"""
     order = set_order(order)
     request.session["order"] = order[0]
-    movies = MovieFile.objects.filter(movie__genres__contains=genre, file_status="OK")
+    movies = MovieFile.objects.filter(movie__genre_list__name=genre, file_status="OK")
     movies = annotate_usernotes(movies, request)
     movies = movies.order_by(*order)
     paginator, movies, page = paginate(request, movies)
@@ -423,22 +392,13 @@ def movies_count_countries(request, order):
     """number of movies by production countries"""
     order = set_order(order)
     request.session["order"] = order[0]
-    countries_movies = MovieFile.objects.values("movie__countries")
-    num_countries = {}
-    for entry in countries_movies:
-        for country in entry["movie__countries"].split(","):
-            country = country.strip()
-            if not country:
-                continue
-            if country in num_countries:
-                num_countries[country] += 1
-            else:
-                num_countries[country] = 1
-    num_countries = [
-        (country, pycountry.countries.get(alpha_2=country).name, num_countries[country])
-        for country in sorted(num_countries.keys())
-    ]
-    num_countries.sort(key=lambda i: i[1])
+    # (code, name, number of movie files)
+    num_countries = (
+        MovieFile.objects.filter(movie__country_list__isnull=False)
+        .values_list("movie__country_list__code", "movie__country_list__name")
+        .annotate(num_files=Count("id"))
+        .order_by("movie__country_list__name")
+    )
     context = {
         "countries": num_countries,
     }
@@ -452,7 +412,7 @@ def movies_country(request, country, order):
     order = set_order(order)
     request.session["order"] = order[0]
     movies = MovieFile.objects.filter(
-        movie__countries__contains=country, file_status="OK"
+        movie__country_list__code=country.strip(), file_status="OK"
     )
     movies = annotate_usernotes(movies, request)
     movies = movies.order_by(*order)
@@ -469,9 +429,7 @@ def movies_language(request, language, order):
     """movies by language"""
     order = set_order(order)
     request.session["order"] = order[0]
-    movies = MovieFile.objects.filter(
-        movie__language__contains=language, file_status="OK"
-    )
+    movies = MovieFile.objects.filter(movie__language=language, file_status="OK")
     annotate_usernotes(movies, request)
     movies = movies.order_by(*order)
     paginator, movies, page = paginate(request, movies)
@@ -492,9 +450,9 @@ def searchbypath(request, volume, query, order):
         qvar &= Q(movie__title_ai__contains=query_ai) | Q(
             movie__original_title__contains=query
         )
-    if volume not in [None, "", settings.ALL_VOLUMES]:
-        qvar &= Q(file__istartswith=volume)
-    movies = annotate_usernotes(MovieFile.objects.filter(qvar), request)
+    movies = annotate_usernotes(
+        MovieFile.objects.on_volume(volume).filter(qvar), request
+    )
     movies = movies.order_by(*order)
     paginator, movies, page = paginate(request, movies)
     vol_label = get_volume_alias(volume)
@@ -636,37 +594,36 @@ def m_movie_details(request, idmovie):
 
 def movies_count_by_resolution(request):
     """count movies by screen resolution"""
-    resolutions = {}
-    res = MovieFile.objects.all().values("screen_size")
-    resolutions = []
-    for movie in res:
-        width, height = movie["screen_size"].split("x")
-        width = int(width)
-        height = int(height)
-        if height > width:
-            width, height = height, width
-        resolutions.append((width, height))
-    count = Counter(resolutions)
-    resolutions = sorted(count.items(), key=lambda item: (item[0], item[1]))
+    # (width, height, number of files)
+    resolutions = (
+        MovieFile.objects.filter(width__isnull=False)
+        .values_list("width", "height")
+        .annotate(num_files=Count("id"))
+        .order_by("width", "height")
+    )
     context = {
         "resolutions": resolutions,
+        "classes": MovieFile.objects.resolution_counts(),
     }
     return render(request, "movie/movies_res.html", add_context_bar(request, context))
 
 
 def movies_by_resolution(request, width, height):
     """movies by screen resolution"""
-    if not height:
-        movies = MovieFile.objects.filter(screen_size__startswith=f"{width}x").order_by(
-            "movie__release_year"
-        )
+    if not width.isdigit():
+        # resolution class (e.g. "1080p")
+        movies = MovieFile.objects.with_resolution(width)
+        resolution = width
+    elif not height.isdigit():
+        movies = MovieFile.objects.filter(width=int(width))
+        resolution = f"{width}x"
     else:
-        movies = MovieFile.objects.filter(screen_size=f"{width}x{height}").order_by(
-            "movie__release_year"
-        )
+        movies = MovieFile.objects.filter(width=int(width), height=int(height))
+        resolution = f"{width}x{height}"
+    movies = movies.order_by("movie__release_year")
     paginator, movies, page = paginate(request, annotate_usernotes(movies, request))
     context = {
-        "table_type": f"{paginator.count} Movies with resolution {width}x{height} (page {page} on {paginator.num_pages})",
+        "table_type": f"{paginator.count} Movies with resolution {resolution} (page {page} on {paginator.num_pages})",
         "movies": movies,
     }
     return render(request, "movie/movies_found.html", add_context_bar(request, context))
@@ -853,8 +810,23 @@ def set_movies_per_page(request):
 def advanced_search(request):
     """advanced search"""
     if request.method != "POST":
+        # streams choices (kind, language / codec indexes)
+        audio_languages = (
+            Stream.objects.filter(kind="audio", language__isnull=False)
+            .order_by("language")
+            .values_list("language", flat=True)
+            .distinct()
+        )
+        video_codecs = (
+            Stream.objects.filter(kind="video", codec__isnull=False)
+            .order_by("codec")
+            .values_list("codec", flat=True)
+            .distinct()
+        )
         context = {
             "volumes": settings.VOLUMES,
+            "audio_languages": audio_languages,
+            "video_codecs": video_codecs,
         }
         if "adv_search" in request.session:
             # set previous query
@@ -884,13 +856,21 @@ def advanced_search(request):
         qvar |= Q(movie__team__name__contains=query)
     if "character" in request.POST:
         qvar |= Q(movie__team__extension__contains=query)
+    # streams filters
+    streams = []
+    if request.POST.get("audio_lang"):
+        streams.append({"kind": "audio", "language": request.POST["audio_lang"]})
+    if request.POST.get("video_codec"):
+        streams.append({"kind": "video", "codec": request.POST["video_codec"]})
+    if "subtitles" in request.POST:
+        streams.append({"kind": "subtitle"})
+    for stream in streams:
+        qvar &= Q(id__in=Stream.objects.filter(**stream).values("moviefile"))
     volume = request.POST["vol"]
-    if volume not in [None, "", settings.ALL_VOLUMES]:
-        qvar &= Q(file__istartswith=volume)
     qvar &= Q(file_status="OK")
     order = set_order(request.POST["order"])
     request.session["order"] = order[0]
-    movies = MovieFile.objects.filter(qvar).distinct()
+    movies = MovieFile.objects.on_volume(volume).filter(qvar).distinct()
     movies = annotate_usernotes(movies, request)
     movies = movies.order_by(*order)
     paginator, movies, page = paginate(request, movies)
@@ -912,9 +892,8 @@ def test_mailing(request, days):
     else:
         days = 7
     date_from = datetime.now() - timedelta(days=days)
-    movies = MovieFile.objects.filter(
+    movies = MovieFile.objects.on_volume(settings.MAIN_VOLUME[0]).filter(
         file_status="OK",
-        file__istartswith=settings.MAIN_VOLUME[0],
         date_added__gte=make_aware(date_from),
     ).order_by("movie__title")
     admin_users = User.objects.filter(is_staff=1)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Local caches stored on disk (sqlite)
+
+Warning: only python standard library here, module shared with manage_moviesite.py
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+def hit_rate(cache):
+    """hit rate string of cache (empty if cache not used)"""
+    total = cache.hits + cache.misses
+    return f" ({cache.hits / total:.0%} hit rate)" if total else ""
+
+
+class ProbeCache:
+    """
+    ffprobe results and fingerprints cache, keyed by file (normalized path, size, mtime)
+        a file modified since probing is probed again
+    """
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+        # cache can be used by probing threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(dbname, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS probe ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, json TEXT,"
+                " fingerprint TEXT)"
+            )
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(probe)")]
+            if "fingerprint" not in columns:
+                # cache created before fingerprints
+                self.conn.execute("ALTER TABLE probe ADD COLUMN fingerprint TEXT")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_path):
+        """return cache key (path, size, mtime) : one stat call"""
+        stat = os.stat(file_path)
+        path = os.path.normcase(os.path.abspath(file_path))
+        return (path, stat.st_size, stat.st_mtime)
+
+    def get(self, key):
+        """return ffprobe json string for key, or None"""
+        path, size, mtime = key
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT json FROM probe WHERE path=? AND size=? AND mtime=?",
+                (path, size, mtime),
+            ).fetchone()
+            if row and row[0] is not None:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+        return None
+
+    def put(self, key, json_probe):
+        """store ffprobe json string for key (fingerprint of same file kept)"""
+        path, size, mtime = key
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO probe (path, size, mtime, json) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (path) DO UPDATE SET json=excluded.json,"
+                " fingerprint=CASE WHEN size=excluded.size AND mtime=excluded.mtime"
+                " THEN fingerprint END, size=excluded.size, mtime=excluded.mtime",
+                (path, size, mtime, json_probe),
+            )
+
+    def get_fingerprint(self, key):
+        """return file fingerprint for key, or None"""
+        path, size, mtime = key
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fingerprint FROM probe WHERE path=? AND size=? AND mtime=?",
+                (path, size, mtime),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_fingerprint(self, key, fingerprint):
+        """store file fingerprint for key (ffprobe result of same file kept)"""
+        path, size, mtime = key
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO probe (path, size, mtime, fingerprint) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (path) DO UPDATE SET fingerprint=excluded.fingerprint,"
+                " json=CASE WHEN size=excluded.size AND mtime=excluded.mtime"
+                " THEN json END, size=excluded.size, mtime=excluded.mtime",
+                (path, size, mtime, fingerprint),
+            )
+
+    def stats(self):
+        """cache statistics string"""
+        return f"Probe cache : {self.hits} hits, {self.misses} misses{hit_rate(self)}"
+
+    def close(self):
+        """close database"""
+        self.conn.close()
+
+
+class ResponseCache:
+    """
+    Web API responses cache (TMDB), keyed by request
+        entries expire after a time to live depending on endpoint,
+        least recently used entries are removed when cache exceeds max_size bytes
+    """
+
+    def __init__(self, dbname, ttls, max_size):
+        self.dbname = dbname
+        self.ttls = ttls
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(dbname, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS response ("
+                "key TEXT PRIMARY KEY, endpoint TEXT, json TEXT, size INTEGER,"
+                " created REAL, accessed REAL)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)"
+            )
+            # size of responses, kept up to date by put (no table scan on each put)
+            self.size = self.total_size()
+        self.hits = 0
+        self.misses = 0
+
+    def total_size(self):
+        """size of responses in database (table scan, lock must be owned)"""
+        return self.conn.execute("SELECT SUM(size) FROM response").fetchone()[0] or 0
+
+    def ttl(self, endpoint):
+        """time to live for endpoint"""
+        return self.ttls.get(endpoint, self.ttls.get("default", 0))
+
+    def get(self, key, endpoint):
+        """return response (json decoded) for key, or None"""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT json, created FROM response WHERE key=?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl(endpoint):
+                self.conn.execute(
+                    "UPDATE response SET accessed=? WHERE key=?", (now, key)
+                )
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+        return None
+
+    def put(self, key, endpoint, response):
+        """store response for key, and remove least recently used entries if needed"""
+        data = json.dumps(response)
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT size FROM response WHERE key=?", (key,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO response (key, endpoint, json, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, data, len(data), now, now),
+            )
+            self.size += len(data) - (row[0] if row else 0)
+            if self.size > self.max_size:
+                # exact size : cache can be shared by several processes
+                self.size = self.total_size()
+                if self.size > self.max_size:
+                    self.size -= self.evict(self.size - self.max_size * 0.9)
+
+    def evict(self, size_to_free):
+        """
+        remove least recently used entries (lock must be owned)
+            return size freed
+        """
+        freed = 0
+        keys = []
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM response ORDER BY accessed"
+        ):
+            if freed >= size_to_free:
+                break
+            keys.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM response WHERE key=?", keys)
+        return freed
+
+    def stats(self):
+        """cache statistics string"""
+        return f"TMDB cache : {self.hits} hits, {self.misses} misses{hit_rate(self)}"
+
+    def close(self):
+        """close database"""
+        self.conn.close()
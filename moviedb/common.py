@@ -3,7 +3,12 @@ Some functions/classes common to apps
 """
 
 import os
+import ntpath
+import hashlib
 import platform
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 if platform.system() == "Windows":
     import win32api
@@ -50,3 +55,109 @@ def build_dbfilename(fname, volumes):
         dbfname = volname + fname[1:]
     dbfname = dbfname.replace("/", "\\")
     return dbfname
+
+
+def build_osfilename(dbfname, volumes):
+    """build filesystem filename from database filename (see build_dbfilename)"""
+    label, sep, path = dbfname.partition(":")
+    if not sep or len(label) < 2:
+        return dbfname
+    letters = {volname.lower(): letter for letter, (volname, _) in volumes.items()}
+    if label.lower() in letters:
+        return letters[label.lower()] + ":" + path
+    # suppose it is a network share
+    return "\\\\" + label + path
+
+
+def volume_mounted(dbfname, volumes):
+    """
+    volume of database filename is available : drive of volume mounted or
+    network share reachable (see build_dbfilename)
+    """
+    label, sep, path = dbfname.partition(":")
+    if not sep or len(label) < 2:
+        return True
+    if label.lower() in {volname.lower() for volname, _ in volumes.values()}:
+        return True
+    # suppose it is a network share
+    share = path.strip("\\").split("\\")[0]
+    return os.path.exists("\\\\" + label + "\\" + share)
+
+
+def file_fingerprint(fname, chunk_size=4 * 1024 * 1024):
+    """
+    content fingerprint of a file : size and sha1 of first and last chunks
+        cheap (reads 8 MB at most) and unchanged by a move or a copy
+    """
+    size = os.path.getsize(fname)
+    sha1 = hashlib.sha1()
+    with open(fname, "rb") as fd:
+        sha1.update(fd.read(chunk_size))
+        if size > chunk_size:
+            fd.seek(max(chunk_size, size - chunk_size))
+            sha1.update(fd.read(chunk_size))
+    return f"{size}-{sha1.hexdigest()}"
+
+
+def cached_fingerprint(fname, cache=None):
+    """
+    fingerprint of a file, stored in probe results cache (ProbeCache)
+        file read only if changed since last fingerprint
+    """
+    if not cache:
+        return file_fingerprint(fname)
+    key = cache.key(fname)
+    fingerprint = cache.get_fingerprint(key)
+    if fingerprint is None:
+        fingerprint = file_fingerprint(fname)
+        cache.put_fingerprint(key, fingerprint)
+    return fingerprint
+
+
+def title_year_from_filename(fname):
+    """
+    Guess movie title and year from filename
+        e.g. "Hollow man.2000.mkv" -> ("Hollow man", "2000")
+        year is None if not found
+    """
+    _, moviename = ntpath.split(fname)
+    moviename, _ = ntpath.splitext(moviename)
+    # get optionnal year after title (ex: "Hollow man.2000")
+    year = None
+    words = moviename.split(".")
+    for _id in range(len(words) - 1, 0, -1):
+        if words[_id].isnumeric() and 1900 < int(words[_id]) < 2100:
+            year = words[_id]
+            moviename = " ".join(words[:_id])
+            break
+    # replace various characters
+    moviename = moviename.replace(".", " ").replace("_", " ")
+    return moviename, year
+
+
+def normalize_dbfilename(dbfname):
+    """database filename normalized for case insensitive comparisons"""
+    return dbfname.replace("/", "\\").lower()
+
+
+_HTTP_SESSION = None
+
+
+def get_http_session():
+    """
+    Return the http session shared in process
+        keep-alive connections, retries with backoff on connection errors and
+        server errors
+    """
+    global _HTTP_SESSION  # pylint: disable=global-statement
+    if _HTTP_SESSION is None:
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+        _HTTP_SESSION = requests.Session()
+        _HTTP_SESSION.mount("http://", adapter)
+        _HTTP_SESSION.mount("https://", adapter)
+    return _HTTP_SESSION
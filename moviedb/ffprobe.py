@@ -14,8 +14,20 @@ class FFProbeResult(NamedTuple):
     error: str
 
 
-def ffprobe(file_path) -> FFProbeResult:
-    """return ffprobe in json format"""
+def ffprobe(file_path, timeout=None, cache=None) -> FFProbeResult:
+    """
+    return ffprobe in json format
+        timeout : max seconds for probing (None = no limit)
+        cache : ProbeCache instance, file not probed if unchanged since last probe
+    """
+    if cache:
+        try:
+            key = cache.key(file_path)
+        except OSError as _e:
+            return FFProbeResult(return_code=1212, json="", error=str(_e))
+        json = cache.get(key)
+        if json is not None:
+            return FFProbeResult(return_code=0, json=json, error="")
     command_array = [
         "ffprobe",
         "-v",
@@ -34,9 +46,16 @@ def ffprobe(file_path) -> FFProbeResult:
             universal_newlines=True,
             encoding="utf8",
             check=True,
+            timeout=timeout,
         )
-    except (UnicodeDecodeError, subprocess.CalledProcessError) as _e:
+    except (
+        UnicodeDecodeError,
+        subprocess.CalledProcessError,
+        subprocess.TimeoutExpired,
+    ) as _e:
         return FFProbeResult(return_code=1212, json="", error=str(_e))
+    if cache and result.returncode == 0:
+        cache.put(key, result.stdout)
     return FFProbeResult(
         return_code=result.returncode, json=result.stdout, error=result.stderr
     )
@@ -79,3 +98,36 @@ def smart_probe(ffmpeg_json):
         else ""
     )
     return ffmpeg_json
+
+
+def stream_infos(ffmpeg_json):
+    """
+    video, audio and subtitle streams of ffmpeg probe : list of dict
+        kind, codec, language (iso 639-2, e.g. "fre", None if undefined),
+        channels, width, height, bitrate (None if unknown)
+    """
+
+    def integer(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    streams = []
+    for stream in ffmpeg_json.get("streams", []):
+        kind = stream.get("codec_type")
+        if kind not in ["video", "audio", "subtitle"]:
+            continue
+        language = (stream.get("tags") or {}).get("language", "").lower()
+        streams.append(
+            {
+                "kind": kind,
+                "codec": stream.get("codec_name"),
+                "language": language if language not in ["", "und"] else None,
+                "channels": integer(stream.get("channels")),
+                "width": integer(stream.get("width")),
+                "height": integer(stream.get("height")),
+                "bitrate": integer(stream.get("bit_rate")),
+            }
+        )
+    return streams
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Run journal stored on disk (sqlite) : checkpoints of long parsing runs
+
+Warning: only python standard library here, module shared with manage_moviesite.py
+"""
+import json
+import time
+import sqlite3
+
+# stages of a file in a run :
+#   probed : ffprobe done
+#   matched : TMDB movie chosen (data : TMDB id)
+#   stored : movie stored in database, but posters not all downloaded
+#   done : file completely processed
+#   skipped : file not stored (error, no suggestions, no choice ...)
+FINAL_STAGES = ("done", "skipped")
+
+
+class RunJournal:
+    """
+    Journal of runs : arguments of each run, and last stage reached by each file
+        a run can be resumed, skipping files already processed
+    """
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+        self.conn = sqlite3.connect(dbname, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS run ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, command TEXT, args TEXT,"
+                " started REAL, finished REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entry ("
+                "run INTEGER, path TEXT, stage TEXT, data TEXT, updated REAL,"
+                " PRIMARY KEY (run, path))"
+            )
+        self.run = None
+        self.stages = {}
+
+    def start(self, command, args):
+        """start a new run, return its id"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO run (command, args, started) VALUES (?, ?, ?)",
+                (command, json.dumps(args), time.time()),
+            )
+        self.run = cursor.lastrowid
+        self.stages = {}
+        return self.run
+
+    def resume(self, run, command):
+        """resume run, return its arguments (None if run unknown)"""
+        row = self.conn.execute(
+            "SELECT args FROM run WHERE id=? AND command=?", (run, command)
+        ).fetchone()
+        if not row:
+            return None
+        self.run = run
+        self.stages = {
+            path: (stage, json.loads(data) if data else None)
+            for path, stage, data in self.conn.execute(
+                "SELECT path, stage, data FROM entry WHERE run=?", (run,)
+            )
+        }
+        with self.conn:
+            self.conn.execute("UPDATE run SET finished=NULL WHERE id=?", (run,))
+        return json.loads(row[0])
+
+    def stage(self, path):
+        """(stage, data) reached by path in resumed run, or (None, None)"""
+        return self.stages.get(path, (None, None))
+
+    def done(self, path):
+        """True if path completely processed in resumed run"""
+        return self.stage(path)[0] in FINAL_STAGES
+
+    def mark(self, path, stage, data=None):
+        """checkpoint stage reached by path"""
+        self.mark_many([(path, stage, data)])
+
+    def mark_many(self, checkpoints):
+        """checkpoint list of (path, stage, data)"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entry (run, path, stage, data, updated)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.run, path, stage, json.dumps(data), now)
+                    for path, stage, data in checkpoints
+                ],
+            )
+
+    def finish(self):
+        """end of run"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE run SET finished=? WHERE id=?", (time.time(), self.run)
+            )
+
+    def stats(self):
+        """run statistics string"""
+        counts = dict(
+            self.conn.execute(
+                "SELECT stage, COUNT(*) FROM entry WHERE run=? GROUP BY stage",
+                (self.run,),
+            ).fetchall()
+        )
+        counts = ", ".join(f"{count} {stage}" for stage, count in sorted(counts.items()))
+        return f"Run {self.run} : {counts if counts else 'no files'}"
+
+    def close(self):
+        """close database"""
+        self.conn.close()
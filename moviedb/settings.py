@@ -290,3 +290,43 @@ HIDDEN_FIELDS = ["size", "file", "format"]
 
 # Max number of posters to import from TMDB
 MAX_POSTERS = 4
+# Posters download : parallel downloads, timeout (connect, read) for one poster, and
+# max seconds for all posters of a movie (remaining posters are left to "manage.py backfill posters")
+POSTER_DOWNLOAD_JOBS = 4
+POSTER_DOWNLOAD_TIMEOUT = (5, 20)
+POSTER_DOWNLOAD_BUDGET = 30
+
+# Max seconds for probing a video file (ffprobe) : protect scans from hung network files
+FFPROBE_TIMEOUT = 120
+
+# ffprobe results cache (sqlite file) : unchanged files are not probed again
+PROBE_CACHE = os.path.join(BASE_DIR, "probecache.db")
+
+# TMDB responses cache (sqlite file), shared by command movieparsing and web api
+TMDB_CACHE = os.path.join(BASE_DIR, "tmdbcache.db")
+# max size of TMDB cache (bytes) : least recently used responses are removed
+TMDB_CACHE_MAX_SIZE = 200 * 1000 * 1000
+# time to live (seconds) of TMDB responses, by endpoint
+TMDB_CACHE_TTL = {
+    "configuration": 7 * 24 * 3600,
+    "search": 7 * 24 * 3600,
+    "movie": 30 * 24 * 3600,
+    "person": 90 * 24 * 3600,
+    "tv": 7 * 24 * 3600,
+    "default": 24 * 3600,
+}
+# TMDB requests rate limit for concurrent requests (asyncio client)
+TMDB_REQUESTS_PER_SECOND = 40
+TMDB_MAX_REQUESTS_IN_FLIGHT = 16
+
+# Automatic choice among several TMDB suggestions : candidates are scored (0 to 1)
+# on title similarity, year, runtime and audio language ; best candidate is chosen if its
+# score reaches AUTO_MATCH_CONFIDENCE and exceeds next candidate by AUTO_MATCH_MARGIN
+# (set AUTO_MATCH_CONFIDENCE above 1 to always choose manually)
+AUTO_MATCH_CONFIDENCE = 0.75
+AUTO_MATCH_MARGIN = 0.1
+# candidates whose details (runtime) are requested to TMDB for scoring
+AUTO_MATCH_DETAILS = 3
+
+# Journal of parsing runs (sqlite file) : checkpoints for option --resume of movieparsing
+RUN_JOURNAL = os.path.join(BASE_DIR, "runjournal.db")
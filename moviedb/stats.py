@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Timers and counters of parsing pipeline stages (walk, probe, tmdb, db, posters)
+
+Warning: only python standard library here, module shared with manage_moviesite.py
+"""
+import json
+import math
+import time
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+def percentile(values, percent):
+    """percentile of sorted values (nearest rank)"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+class StageTimer:
+    """
+    Durations of stages and counters of a run
+        - stages can be timed in worker threads
+        - time spent in a nested stage is counted only in the nested stage
+        - optional trace file : one json line per timed stage
+    """
+
+    def __init__(self, trace=None):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.durations = defaultdict(list)
+        self.counters = Counter()
+        self.started = time.perf_counter()
+        self.trace = open(trace, "a", encoding="utf-8") if trace else None
+
+    @contextmanager
+    def stage(self, name, item=None):
+        """time a stage (context manager), item : file or request traced"""
+        if not hasattr(self.local, "nested"):
+            self.local.nested = []
+        self.local.nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            nested = self.local.nested.pop()
+            if self.local.nested:
+                self.local.nested[-1] += duration
+            self.add(name, duration - nested, item)
+
+    def iterate(self, name, iterable):
+        """yield items of iterable, timing the production of each item as a stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, name, duration, item=None):
+        """add a stage duration (seconds)"""
+        with self.lock:
+            self.durations[name].append(duration)
+            if self.trace:
+                self.trace.write(
+                    json.dumps(
+                        {
+                            "time": round(time.time(), 3),
+                            "stage": name,
+                            "item": item,
+                            "duration": round(duration, 6),
+                        }
+                    )
+                    + "\n"
+                )
+
+    def count(self, name, num=1):
+        """increment a counter"""
+        with self.lock:
+            self.counters[name] += num
+
+    def timings(self):
+        """total duration of each stage : {stage: seconds}"""
+        with self.lock:
+            return {
+                name: round(sum(durations), 6)
+                for name, durations in self.durations.items()
+            }
+
+    def summary(self):
+        """
+        summary lines of run : files per second (counter "files"), duration
+        percentiles of each stage, counters
+        """
+        elapsed = time.perf_counter() - self.started
+        files = self.counters["files"]
+        lines = [
+            f"{files} files in {elapsed:.1f}s ({files / elapsed if elapsed else 0:.2f} files/s)"
+        ]
+        with self.lock:
+            for name, durations in self.durations.items():
+                durations = sorted(durations)
+                lines.append(
+                    f"  {name:<16} {len(durations):6} x  total {sum(durations):8.2f}s"
+                    f"  p50 {percentile(durations, 50) * 1000:8.1f}ms"
+                    f"  p95 {percentile(durations, 95) * 1000:8.1f}ms"
+                )
+            counters = ", ".join(
+                f"{count} {name}"
+                for name, count in sorted(self.counters.items())
+                if name != "files"
+            )
+        if counters:
+            lines.append(f"  {counters}")
+        return "\n".join(lines)
+
+    def close(self):
+        """close trace file"""
+        if self.trace:
+            self.trace.close()
+            self.trace = None
@@ -2,6 +2,11 @@
 """
 TMDb access
 """
+import time
+import asyncio
+import threading
+from urllib.parse import urlencode
+
 from tmdbv3api import (
     TMDb,
     TV as TMDbTV,
@@ -14,23 +19,224 @@ from tmdbv3api import (
 )
 from tmdbv3api.exceptions import TMDbException
 
+from moviedb.common import get_http_session
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+
+
+def endpoint(action):
+    """endpoint of TMDb request action (e.g. "movie" for "/movie/603/credits")"""
+    return action.strip("/").split("/")[0]
+
+
+class TokenBucket:
+    """
+    asyncio token bucket : rate tokens per second, up to burst tokens in reserve
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """wait for a token"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncTMDbClient:
+    """
+    asyncio TMDb client
+        - requests rate limited by a token bucket, and number of requests in flight limited
+        - identical requests in flight are made only once
+        - responses shared with TMDB_Api through the responses cache (same keys)
+    Requests are run in threads with the shared requests session (keep-alive, retries).
+    Must be created in the running event loop.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        language,
+        cache=None,
+        base_url=TMDB_BASE_URL,
+        rate=40,
+        max_inflight=16,
+        timeout=30,
+    ):
+        self.api_key = api_key
+        self.language = language
+        self.cache = cache
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = get_http_session()
+        self.bucket = TokenBucket(rate, rate)
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = {}
+        self.requests = 0
+
+    async def call(self, action, params=""):
+        """GET TMDb request, return json decoded response"""
+        key = f"{action}?{params}&language={self.language}"
+        if self.cache:
+            response = self.cache.get(key, endpoint(action))
+            if response is not None:
+                return response
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.request(action, params, key))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await task
+
+    async def request(self, action, params, key):
+        """GET TMDb request, rate limited"""
+        url = f"{self.base_url}{action}?api_key={self.api_key}&{params}&language={self.language}"
+        async with self.semaphore:
+            await self.bucket.acquire()
+            self.requests += 1
+            req = await asyncio.to_thread(self.session.get, url, timeout=self.timeout)
+        response = req.json()
+        if "errors" in response:
+            raise TMDbException(response["errors"])
+        if response.get("success", True) is False:
+            raise TMDbException(response.get("status_message"))
+        if self.cache:
+            self.cache.put(key, endpoint(action), response)
+        return response
+
+    async def search_movies(self, moviename, year=None):
+        """search movies, as TMDbSearch.movies"""
+        return await self.call(
+            TMDbSearch._urls["movies"], urlencode({"query": moviename, "year": year})
+        )
+
+    async def movie_details(self, id_tmdb, append_to_response):
+        """movie details, as TMDbMovie.details"""
+        return await self.call(
+            TMDbMovie._urls["details"] % id_tmdb,
+            "append_to_response=" + append_to_response,
+        )
+
+    async def person_images(self, id_tmdb):
+        """person images, as TMDbPerson.images"""
+        return await self.call(TMDbPerson._urls["images"] % str(id_tmdb), "")
+
 
 class TMDB_Api:
-    """store TMDB api, handles"""
+    """
+    store TMDB api, handles
+        cache : optional ResponseCache, used by all TMDb requests
+    """
 
-    def __init__(self, api_key, language):
+    def __init__(self, api_key, language, cache=None):
         self.tmdb = TMDb()
         self.tmdb.api_key = api_key
         self.tmdb.language = language
-        self.config = Configuration().info()
-        self.serie = TMDbTV()
-        self.season = TMDbSeason()
-        self.episode = TMDbEpisode()
-        self.search = TMDbSearch()
-        self.movie = TMDbMovie()
-        self.person = TMDbPerson()
+        self.cache = cache
+        self.configuration = self.use_cache(Configuration())
+        self.serie = self.use_cache(TMDbTV())
+        self.season = self.use_cache(TMDbSeason())
+        self.episode = self.use_cache(TMDbEpisode())
+        self.search = self.use_cache(TMDbSearch())
+        self.movie = self.use_cache(TMDbMovie())
+        self.person = self.use_cache(TMDbPerson())
+        self.config = self.configuration.info()
         self.cache_serie_details = {}
         self.cache_season_details = {}
+        # asyncio client, running in a background event loop
+        self.loop = None
+        self.thread = None
+        self.aio = None
+
+    def start_async(self, rate=40, max_inflight=16, base_url=TMDB_BASE_URL):
+        """start asyncio TMDb client (see AsyncTMDbClient) in a background thread"""
+        if self.loop:
+            return
+
+        async def create_client():
+            return AsyncTMDbClient(
+                self.tmdb.api_key,
+                self.tmdb.language,
+                cache=self.cache,
+                base_url=base_url,
+                rate=rate,
+                max_inflight=max_inflight,
+            )
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.aio = self.submit(create_client()).result()
+
+    def submit(self, coroutine):
+        """run coroutine in the asyncio client loop, return concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def gather(self, coroutines):
+        """run coroutines concurrently, return results (or exceptions) in same order"""
+
+        async def gather_all():
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+
+        return self.submit(gather_all()).result()
+
+    def stop_async(self):
+        """stop asyncio TMDb client : pending requests cancelled, loop closed"""
+        if not self.loop:
+            return
+
+        async def cancel_tasks():
+            tasks = [
+                task
+                for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+            ]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.submit(cancel_tasks()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+        self.aio = None
+
+    def use_cache(self, tmdb_obj):
+        """route GET requests of TMDb object through the responses cache"""
+        if not self.cache:
+            return tmdb_obj
+        call = tmdb_obj._call
+
+        def cached_call(
+            action, append_to_response, call_cached=True, method="GET", data=None
+        ):
+            if method != "GET":
+                return call(action, append_to_response, call_cached, method, data)
+            key = f"{action}?{append_to_response}&language={tmdb_obj.language}"
+            response = self.cache.get(key, endpoint(action))
+            if response is None:
+                response = call(action, append_to_response, call_cached, method, data)
+                if response.get("success", True):
+                    self.cache.put(key, endpoint(action), response)
+            return response
+
+        tmdb_obj._call = cached_call
+        return tmdb_obj
 
     def get_serie_details(self, id_tmdb):
         """get serie details"""